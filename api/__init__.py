@@ -0,0 +1,4 @@
+import dotenv
+
+# Before any module of the package reads its settings from the environment
+dotenv.load_dotenv()
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+from time import monotonic
+from typing import Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """Bounded in-process LRU cache whose entries expire `ttl` seconds after they were stored.
+
+    Only touched from the event loop, so it needs no locking.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def get(self, key: K) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        if self.maxsize <= 0:
+            return
+
+        self._entries[key] = (monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
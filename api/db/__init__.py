@@ -1,13 +1,35 @@
-from .db import create_db_and_tables, engine
+from .db import commit, engine, on_commit
+from .query_counter import (
+    SQL_STATS,
+    QueryCounter,
+    current_query_counter,
+    get_server_timing,
+    report_queries,
+    start_query_counter,
+)
 from .models.board import Board
 from .models.board_user_access import BoardUserAccess
 from .models.column import Column
 from .models.task import Task
 from .models.task_log import TaskLog
+from .models.tombstone import Tombstone
 from .models.user import User
+from .utils.access import (
+    BoardAccess,
+    get_board_access,
+    get_cached_column_board_id,
+    get_cached_task_board_id,
+    get_column_and_board,
+    get_task_column_and_board,
+    invalidate_board_access,
+    invalidate_column,
+    invalidate_task,
+)
 from .utils.board import (
     get_owned_boards,
     get_shared_boards,
+    touch_user_boards,
+    get_full_board,
     create_board,
     update_board,
     delete_board,
@@ -15,6 +37,47 @@ from .utils.board import (
     add_user,
     remove_user,
 )
-from .utils.columns import get_columns, get_column_by_id, create_column, update_column, delete_column
-from .utils.task import get_tasks, create_task, update_task, delete_task, get_task_logs, create_task_log
-from .utils.user import get_user_by_id, get_user_by_username, register_user, update_user
+from .utils.changes import get_changes, get_pending_revision, get_revision, next_revision, next_revisions
+from .utils.columns import (
+    get_columns,
+    get_column_by_id,
+    get_column_by_position,
+    get_columns_by_ids,
+    create_column,
+    move_column,
+    rebalance_column_positions,
+    update_column,
+    delete_column,
+)
+from .utils.ordering import MAX_POSITION
+from .utils.pagination import InvalidCursorError, Pagination
+from .utils.search import search_tasks
+from .utils.task import (
+    get_tasks,
+    get_board_tasks,
+    get_assigned_tasks,
+    get_task_by_position,
+    get_tasks_by_ids,
+    get_next_task_position,
+    create_task,
+    create_tasks,
+    append_tasks,
+    move_task,
+    rebalance_task_positions,
+    update_task,
+    update_tasks,
+    delete_task,
+    delete_tasks,
+    get_task_logs,
+    create_task_logs,
+)
+from .utils.user import (
+    get_user_by_id,
+    get_users_by_ids,
+    get_user_by_username,
+    get_cached_user,
+    register_user,
+    update_user,
+)
+from .utils.versions import VersionConflictError
+from .schema import SCHEMA_REVISION, SchemaVersionError, check_schema_version, migrate, prepare_schema
@@ -1,23 +1,131 @@
 from os import getenv
+from typing import Any, Callable
+from uuid import uuid4
 
 import sqlalchemy
-from sqlmodel import SQLModel, create_engine
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 import api.utils
 
+from .query_counter import TimedQueuePool, install_query_counter
 
-engine = create_engine(
-    sqlalchemy.URL.create(
-        drivername="postgresql",
-        username=api.utils.read_secret("POSTGRES_USER"),
-        password=api.utils.read_secret("POSTGRES_PASSWORD"),
-        database=getenv("POSTGRES_DB"),
-        host="db",
-        port=5432,
-    ),
-    echo=getenv("DEBUG") == "True"
-)
 
+# Any database SQLAlchemy has an async driver for, e.g. sqlite+aiosqlite:///:memory: for an isolated, throwaway
+# instance. Built from POSTGRES_DB, POSTGRES_HOST, POSTGRES_PORT and the POSTGRES_USER and POSTGRES_PASSWORD secrets
+# if unset.
+DATABASE_URL = getenv("DATABASE_URL")
+# For URLs that don't name a driver, like postgresql://
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+# Every worker process has its own pool, so the API opens up to
+#
+#     WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+#
+# connections, plus one per worker to LISTEN with EVENTS_BROKER=postgres. Keep that below the server's
+# max_connections (100 by default, minus the few reserved for superusers) or PgBouncer's max_client_conn.
+# PostgreSQL itself runs best with about 2 * CPU cores + disks queries at once, more only queue inside it: aim
+# WEB_CONCURRENCY * DB_POOL_SIZE at that and let DB_MAX_OVERFLOW absorb bursts. E.g. 4 workers against an 8 core
+# server: DB_POOL_SIZE=4, DB_MAX_OVERFLOW=4, 32 connections at most.
+DB_POOL_SIZE = int(getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(getenv("DB_MAX_OVERFLOW", "10"))
+# Seconds a request waits for a connection before getting 503
+DB_POOL_TIMEOUT = float(getenv("DB_POOL_TIMEOUT", "30"))
+# Checks connections before use, for servers or proxies that drop idle ones
+DB_POOL_PRE_PING = getenv("DB_POOL_PRE_PING") == "True"
+# Seconds after which connections are replaced, -1 for never
+DB_POOL_RECYCLE = int(getenv("DB_POOL_RECYCLE", "-1"))
+# Milliseconds a statement may run before it is cancelled, 0 for no limit
+DB_STATEMENT_TIMEOUT = int(getenv("DB_STATEMENT_TIMEOUT", "0"))
+# Connecting through PgBouncer in transaction mode, which can't keep prepared statements or session settings
+DB_PGBOUNCER = getenv("DB_PGBOUNCER") == "True"
+
+
+def get_url() -> sqlalchemy.URL:
+    if DATABASE_URL is None:
+        return sqlalchemy.URL.create(
+            drivername="postgresql+asyncpg",
+            username=api.utils.read_secret("POSTGRES_USER"),
+            password=api.utils.read_secret("POSTGRES_PASSWORD"),
+            database=getenv("POSTGRES_DB"),
+            host=getenv("POSTGRES_HOST", "db"),
+            port=int(getenv("POSTGRES_PORT", "5432")),
+        )
+
+    url = sqlalchemy.make_url(DATABASE_URL)
+
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+def is_in_memory(url: sqlalchemy.URL) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def get_engine_args(url: sqlalchemy.URL) -> dict[str, Any]:
+    if is_in_memory(url):
+        # The database lives in its one connection. Sessions take turns with it, sharing it at once would mix up
+        # their transactions.
+        return {"poolclass": TimedQueuePool, "pool_size": 1, "max_overflow": 0}
+    if url.get_backend_name() != "postgresql":
+        return {"poolclass": TimedQueuePool}
+
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "connect_args": get_connect_args(),
+    }
+
+
+def get_connect_args() -> dict[str, Any]:
+    if not DB_PGBOUNCER:
+        if not DB_STATEMENT_TIMEOUT:
+            return {}
+
+        return {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT)}}
+
+    return {
+        # No prepared statement may outlive its transaction, each backend connection serves many clients
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        # PgBouncer rejects unknown startup parameters, cancel from the client instead. Better yet,
+        # ALTER ROLE ... SET statement_timeout on the server.
+        "command_timeout": DB_STATEMENT_TIMEOUT / 1000 if DB_STATEMENT_TIMEOUT else None,
+    }
+
+
+def configure_sqlite(engine: AsyncEngine) -> None:
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        # Off by default, deleting boards and columns relies on ON DELETE CASCADE
+        cursor.execute("PRAGMA foreign_keys = ON")
+        # Readers don't block the writer, a no-op for in-memory databases
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.close()
+
+
+url = get_url()
+engine = create_async_engine(url, echo=getenv("DEBUG") == "True", **get_engine_args(url))
+if url.get_backend_name() == "sqlite":
+    configure_sqlite(engine)
+install_query_counter(engine)
+
+
+def on_commit(session: AsyncSession, callback: Callable[[], None]) -> None:
+    """Runs `callback` once the session's transaction is committed with commit(), drops it on rollback."""
+    session.info.setdefault("on_commit", []).append(callback)
+
+
+async def commit(session: AsyncSession) -> None:
+    await session.commit()
+    # The next transaction bumps board revisions again, see api.db.utils.changes
+    session.info.pop("revisions", None)
+
+    for callback in session.info.pop("on_commit", []):
+        callback()
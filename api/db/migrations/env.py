@@ -0,0 +1,89 @@
+"""Alembic environment, migrates the database of api.db.engine.
+
+Run from the repository root with `alembic upgrade head`, or from code with api.db.migrate().
+"""
+
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from alembic.script import ScriptDirectory
+from sqlalchemy import Connection
+from sqlmodel import SQLModel
+
+import api.db
+
+target_metadata = SQLModel.metadata
+
+# The logging sections of alembic.ini, api.db.migrate() runs without the file and leaves logging to the app
+if context.config.config_file_name is not None:
+    fileConfig(context.config.config_file_name, disable_existing_loggers=False)
+
+# Workers check the database against SCHEMA_REVISION at startup, they would refuse the new head
+head = ScriptDirectory.from_config(context.config).get_current_head()
+if head != api.db.SCHEMA_REVISION:
+    raise api.db.SchemaVersionError(f"Set api.db.schema.SCHEMA_REVISION to the latest migration, {head}")
+
+# PostgreSQL only, left out of the models that also create SQLite databases, see api.db.utils.search
+UNMAPPED_OBJECTS = {
+    ("column", "search_vector"),
+    ("index", "ix_task_search_vector"),
+    ("index", "ix_tasklog_search_vector"),
+}
+
+# In the models, but only created on PostgreSQL, see api.db.models.task
+POSTGRESQL_OBJECTS = {
+    ("index", "ix_task_name_trgm"),
+}
+
+
+def include_object(object, name, type_, reflected, compare_to) -> bool:
+    """Keeps autogenerate from dropping or adding the database objects that differ from the models on purpose."""
+    if reflected and compare_to is None and (type_, name) in UNMAPPED_OBJECTS:
+        return False
+
+    return context.get_context().dialect.name == "postgresql" or (type_, name) not in POSTGRESQL_OBJECTS
+
+
+def run_migrations_offline() -> None:
+    """Prints the SQL instead of running it, for `alembic upgrade head --sql`."""
+    context.configure(
+        url=api.db.engine.url,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations(connection: Connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        # SQLite can't alter most of a table, Alembic copies it into a new one instead
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_migrations_online() -> None:
+    async with api.db.engine.connect() as connection:
+        await connection.run_sync(run_migrations)
+        await connection.commit()
+
+    await api.db.engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+elif (connection := context.config.attributes.get("connection")) is not None:
+    # Called from api.db.migrate() with a connection of its own
+    run_migrations(connection)
+else:
+    asyncio.run(run_migrations_online())
@@ -0,0 +1,137 @@
+"""Initial schema
+
+Databases created by create_all before migrations existed already have it, mark them with
+`alembic stamp 0001` instead.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+revision: str = "0001"
+down_revision: str | None = None
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("username", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("name", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("hashed_password", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("token_version", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("username"),
+    )
+
+    op.create_table(
+        "board",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("owner_id", sa.Integer(), nullable=False),
+        sa.Column("name", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("revision", sa.Integer(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["owner_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_board_owner_id"), "board", ["owner_id"], unique=False)
+
+    op.create_table(
+        "boarduseraccess",
+        sa.Column("board_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["board_id"], ["board.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("board_id", "user_id"),
+    )
+    op.create_index(op.f("ix_boarduseraccess_user_id"), "boarduseraccess", ["user_id"], unique=False)
+
+    op.create_table(
+        "column",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("board_id", sa.Integer(), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.Column("name", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("revision", sa.Integer(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["board_id"], ["board.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("board_id", "position", name="uq_column_board_id_position"),
+    )
+    op.create_index("ix_column_board_id_revision", "column", ["board_id", "revision"], unique=False)
+
+    op.create_table(
+        "tombstone",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("board_id", sa.Integer(), nullable=False),
+        sa.Column("kind", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("item_id", sa.Integer(), nullable=False),
+        sa.Column("revision", sa.Integer(), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["board_id"], ["board.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_tombstone_board_id_revision", "tombstone", ["board_id", "revision"], unique=False)
+
+    op.create_table(
+        "task",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("column_id", sa.Integer(), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.Column("name", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("description", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column("assignee_id", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("created_by", sa.Integer(), nullable=False),
+        sa.Column("revision", sa.Integer(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["assignee_id"], ["user.id"]),
+        sa.ForeignKeyConstraint(["column_id"], ["column.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["created_by"], ["user.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("column_id", "position", name="uq_task_column_id_position"),
+    )
+    op.create_index(op.f("ix_task_assignee_id"), "task", ["assignee_id"], unique=False)
+    op.create_index("ix_task_column_id_assignee_id", "task", ["column_id", "assignee_id"], unique=False)
+    op.create_index("ix_task_column_id_revision", "task", ["column_id", "revision"], unique=False)
+    op.create_index(op.f("ix_task_created_by"), "task", ["created_by"], unique=False)
+
+    op.create_table(
+        "tasklog",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("task_id", sa.Integer(), nullable=False),
+        sa.Column("content", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["task_id"], ["task.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_tasklog_task_id_created_at", "tasklog", ["task_id", "created_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tasklog_task_id_created_at", table_name="tasklog")
+    op.drop_table("tasklog")
+    op.drop_index(op.f("ix_task_created_by"), table_name="task")
+    op.drop_index("ix_task_column_id_revision", table_name="task")
+    op.drop_index("ix_task_column_id_assignee_id", table_name="task")
+    op.drop_index(op.f("ix_task_assignee_id"), table_name="task")
+    op.drop_table("task")
+    op.drop_index("ix_tombstone_board_id_revision", table_name="tombstone")
+    op.drop_table("tombstone")
+    op.drop_index("ix_column_board_id_revision", table_name="column")
+    op.drop_table("column")
+    op.drop_index(op.f("ix_boarduseraccess_user_id"), table_name="boarduseraccess")
+    op.drop_table("boarduseraccess")
+    op.drop_index(op.f("ix_board_owner_id"), table_name="board")
+    op.drop_table("board")
+    op.drop_table("user")
@@ -0,0 +1,62 @@
+"""Search columns and indexes on tasks and task logs
+
+PostgreSQL only, other databases search with LIKE, see api.db.utils.search. Adding the columns rewrites the task and
+tasklog tables, which are locked until the migration is done.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0002"
+down_revision: str | None = "0001"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    # A trusted extension since PostgreSQL 13, the owner of the database may create it
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Matches in the name rank above matches in the description
+    op.add_column("task", sa.Column("search_vector", postgresql.TSVECTOR(), sa.Computed(
+        "setweight(to_tsvector('simple', name), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'B')",
+        persisted=True,
+    )))
+    op.create_index("ix_task_search_vector", "task", ["search_vector"], unique=False, postgresql_using="gin")
+    op.create_index(
+        "ix_task_name_trgm",
+        "task",
+        ["name"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"name": "gin_trgm_ops"},
+    )
+
+    op.add_column("tasklog", sa.Column("search_vector", postgresql.TSVECTOR(), sa.Computed(
+        "to_tsvector('simple', content)",
+        persisted=True,
+    )))
+    op.create_index("ix_tasklog_search_vector", "tasklog", ["search_vector"], unique=False, postgresql_using="gin")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    # pg_trgm stays, other objects of the database may use it
+    op.drop_index("ix_tasklog_search_vector", table_name="tasklog")
+    op.drop_column("tasklog", "search_vector")
+    op.drop_index("ix_task_name_trgm", table_name="task")
+    op.drop_index("ix_task_search_vector", table_name="task")
+    op.drop_column("task", "search_vector")
@@ -0,0 +1,29 @@
+"""Indexes for the task listings by creation date and by assignee
+
+ix_task_assignee_id_created_at replaces ix_task_assignee_id, which it starts with.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence
+
+from alembic import op
+
+revision: str = "0003"
+down_revision: str | None = "0002"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_task_column_id_created_at", "task", ["column_id", "created_at", "id"], unique=False)
+    op.create_index("ix_task_assignee_id_created_at", "task", ["assignee_id", "created_at", "id"], unique=False)
+    op.drop_index("ix_task_assignee_id", table_name="task")
+
+
+def downgrade() -> None:
+    op.create_index("ix_task_assignee_id", "task", ["assignee_id"], unique=False)
+    op.drop_index("ix_task_assignee_id_created_at", table_name="task")
+    op.drop_index("ix_task_column_id_created_at", table_name="task")
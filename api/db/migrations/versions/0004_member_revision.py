@@ -0,0 +1,26 @@
+"""Board revision of the membership changes, for incremental sync of the members
+
+Existing members get revision 0, clients that synced before already have them from the full board.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0004"
+down_revision: str | None = "0003"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column("boarduseraccess", sa.Column("revision", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    op.drop_column("boarduseraccess", "revision")
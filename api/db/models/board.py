@@ -1,7 +1,29 @@
-from sqlmodel import Field, SQLModel
+from typing import TYPE_CHECKING
+
+from sqlmodel import Field, Relationship, SQLModel
+
+from .board_user_access import BoardUserAccess
+
+if TYPE_CHECKING:
+    from .column import Column
+    from .user import User
 
 
 class Board(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
-    owner_id: int = Field(foreign_key="user.id")
+    owner_id: int = Field(foreign_key="user.id", index=True)
     name: str = Field()
+    # Bumped once by every transaction that changes the board, see api.db.utils.changes
+    revision: int = Field(default=0)
+    # Bumped by every change to the row, see api.db.utils.versions
+    version: int = Field(default=1)
+
+    # Read-only and never lazy loaded (that would block in async code), load them explicitly with eager options
+    owner: "User" = Relationship(sa_relationship_kwargs={"viewonly": True, "lazy": "raise"})
+    columns: list["Column"] = Relationship(
+        sa_relationship_kwargs={"viewonly": True, "lazy": "raise", "order_by": "Column.position"}
+    )
+    members: list["User"] = Relationship(
+        link_model=BoardUserAccess,
+        sa_relationship_kwargs={"viewonly": True, "lazy": "raise", "order_by": "User.id"},
+    )
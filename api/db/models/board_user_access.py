@@ -3,4 +3,7 @@ from sqlmodel import Field, SQLModel
 
 class BoardUserAccess(SQLModel, table=True):
     board_id: int = Field(foreign_key="board.id", primary_key=True, ondelete="CASCADE")
-    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    # The primary key only serves lookups by board, shared boards are looked up by user
+    user_id: int = Field(foreign_key="user.id", primary_key=True, index=True)
+    # The board revision the user was added or last changed at
+    revision: int = Field(default=0)
@@ -1,8 +1,31 @@
-from sqlmodel import Field, SQLModel
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from sqlalchemy import Index, UniqueConstraint
+from sqlmodel import Field, Relationship, SQLModel
+
+if TYPE_CHECKING:
+    from .task import Task
 
 
 class Column(SQLModel, table=True):
+    __table_args__ = (
+        # Also serves as the index for listing a board's columns in order
+        UniqueConstraint("board_id", "position", name="uq_column_board_id_position"),
+        Index("ix_column_board_id_revision", "board_id", "revision"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     board_id: int = Field(foreign_key="board.id", ondelete="CASCADE")
     position: int = Field()
     name: str = Field()
+    # The board revision of the last change
+    revision: int = Field(default=0)
+    # Bumped by every change to the row, see api.db.utils.versions
+    version: int = Field(default=1)
+    updated_at: datetime = Field(default_factory=datetime.now, sa_column_kwargs={"onupdate": datetime.now})
+
+    # See Board for why relationships are read-only and raise on lazy load
+    tasks: list["Task"] = Relationship(
+        sa_relationship_kwargs={"viewonly": True, "lazy": "raise", "order_by": "Task.position"}
+    )
@@ -1,9 +1,21 @@
 from datetime import datetime
 
+from sqlalchemy import Index, UniqueConstraint
 from sqlmodel import Field, SQLModel
 
 
 class Task(SQLModel, table=True):
+    __table_args__ = (
+        # Also serves as the index for listing a column's tasks in order
+        UniqueConstraint("column_id", "position", name="uq_task_column_id_position"),
+        Index("ix_task_column_id_assignee_id", "column_id", "assignee_id"),
+        Index("ix_task_column_id_revision", "column_id", "revision"),
+        # Listings by creation date, the id breaks ties for their cursors. The one on assignee_id also serves the
+        # lookups of the foreign key, and lists the tasks of a user across boards without sorting them.
+        Index("ix_task_column_id_created_at", "column_id", "created_at", "id"),
+        Index("ix_task_assignee_id_created_at", "assignee_id", "created_at", "id"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     column_id: int = Field(foreign_key="column.id", ondelete="CASCADE")
     position: int = Field()
@@ -11,4 +23,19 @@ class Task(SQLModel, table=True):
     description: str | None = Field()
     assignee_id: int | None = Field(foreign_key="user.id")
     created_at: datetime = Field(default_factory=datetime.now)
-    created_by: int = Field(foreign_key="user.id")
+    created_by: int = Field(foreign_key="user.id", index=True)
+    # The board revision of the last change
+    revision: int = Field(default=0)
+    # Bumped by every change to the row, see api.db.utils.versions
+    version: int = Field(default=1)
+    updated_at: datetime = Field(default_factory=datetime.now, sa_column_kwargs={"onupdate": datetime.now})
+
+
+# Names similar to a search query, for typos, with the pg_trgm extension on PostgreSQL. Full-text search has columns
+# of its own, see api.db.utils.search.
+Index(
+    "ix_task_name_trgm",
+    Task.name,
+    postgresql_using="gin",
+    postgresql_ops={"name": "gin_trgm_ops"},
+).ddl_if(dialect="postgresql")
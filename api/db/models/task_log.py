@@ -1,9 +1,12 @@
 from datetime import datetime
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
 class TaskLog(SQLModel, table=True):
+    __table_args__ = (Index("ix_tasklog_task_id_created_at", "task_id", "created_at"),)
+
     id: int | None = Field(default=None, primary_key=True)
     task_id: int = Field(foreign_key="task.id", ondelete="CASCADE")
     content: str = Field()
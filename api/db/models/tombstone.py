@@ -0,0 +1,17 @@
+from datetime import datetime
+
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+
+# A deleted column or task or a removed member, kept so clients syncing the board learn about the deletion
+class Tombstone(SQLModel, table=True):
+    __table_args__ = (Index("ix_tombstone_board_id_revision", "board_id", "revision"),)
+
+    id: int | None = Field(default=None, primary_key=True)
+    board_id: int = Field(foreign_key="board.id", ondelete="CASCADE")
+    # "column", "task" or "member", whose item_id is the user id
+    kind: str = Field()
+    item_id: int = Field()
+    revision: int = Field()
+    deleted_at: datetime = Field(default_factory=datetime.now)
@@ -6,3 +6,5 @@ class User(SQLModel, table=True):
     username: str = Field(unique=True)
     name: str = Field()
     hashed_password: str = Field()
+    # Embedded in access tokens, bumped to revoke every token issued before a password change
+    token_version: int = Field(default=0)
@@ -0,0 +1,161 @@
+"""Per-request SQL instrumentation: query counts, database time, pool wait, slow queries and N+1 patterns.
+
+Only the query and checkout counts and the waits for a pool connection, for the metrics, are always on. The rest is
+measured only when enabled, otherwise its event listeners aren't even installed:
+
+- SQL_STATS=True times the queries of every request, reported with its pool wait in its Server-Timing header and
+  logged, one line per request
+- SLOW_QUERY_MS logs the queries that run longer than that, with the route they ran for
+- N_PLUS_ONE_THRESHOLD logs the statements a single request runs more times than that, usually a loop of queries
+  that a single one could replace
+"""
+
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import logging
+from os import getenv
+from time import perf_counter
+from typing import Any
+
+from sqlalchemy import AsyncAdaptedQueuePool, event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+SQL_STATS = getenv("SQL_STATS") == "True"
+# Milliseconds, 0 to log no slow query
+SLOW_QUERY_MS = float(getenv("SLOW_QUERY_MS", "0"))
+# Runs of the same statement in one request, 0 to not look for N+1 patterns
+N_PLUS_ONE_THRESHOLD = int(getenv("N_PLUS_ONE_THRESHOLD", "0"))
+
+
+@dataclass
+class QueryCounter:
+    queries: int = 0
+    checkouts: int = 0
+    # Seconds
+    pool_wait: float = 0.0
+    # Seconds, with SQL_STATS
+    duration: float = 0.0
+    # Runs of each statement, with N_PLUS_ONE_THRESHOLD
+    statements: Counter[str] = field(default_factory=Counter)
+    # ASGI scope of the request, the router adds its route to it
+    scope: dict[str, Any] | None = None
+
+    @property
+    def route(self) -> str:
+        if self.scope is None:
+            return "-"
+
+        route = self.scope.get("route")
+        path = route.path if route is not None else self.scope["path"]
+
+        return f"{self.scope['method']} {path}"
+
+
+current_query_counter: ContextVar[QueryCounter | None] = ContextVar("current_query_counter", default=None)
+
+
+def start_query_counter(scope: dict[str, Any] | None = None) -> QueryCounter:
+    """Starts counting queries and pool checkouts made from the current context, for the request of `scope`."""
+    query_counter = QueryCounter(scope=scope)
+    current_query_counter.set(query_counter)
+
+    return query_counter
+
+
+def get_server_timing(query_counter: QueryCounter) -> str:
+    """Server-Timing header value with the database time and the pool wait of the request, with SQL_STATS."""
+    return (
+        f'db;dur={query_counter.duration * 1000:.1f};desc="{query_counter.queries} queries", '
+        f"db-pool;dur={query_counter.pool_wait * 1000:.1f}"
+    )
+
+
+def report_queries(query_counter: QueryCounter, status_code: int) -> None:
+    """Logs the statistics and the N+1 patterns of a finished request, if enabled."""
+    if SQL_STATS:
+        stats = {
+            "route": query_counter.route,
+            "status": status_code,
+            "queries": query_counter.queries,
+            "checkouts": query_counter.checkouts,
+            "db_ms": round(query_counter.duration * 1000, 1),
+            "pool_wait_ms": round(query_counter.pool_wait * 1000, 1),
+        }
+        logger.info(" ".join(f"{key}={value}" for key, value in stats.items()), extra=stats)
+
+    for statement, runs in query_counter.statements.items():
+        if runs > N_PLUS_ONE_THRESHOLD:
+            logger.warning(
+                "Possible N+1 on %s, same statement run %d times: %s",
+                query_counter.route,
+                runs,
+                shorten(statement),
+                extra={"route": query_counter.route, "runs": runs, "statement": statement},
+            )
+
+
+def shorten(statement: str) -> str:
+    return " ".join(statement.split())[:500]
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Adds the time spent getting a connection, waiting for a free one or opening a new one, to the counter."""
+
+    def connect(self):
+        query_counter = current_query_counter.get()
+        if query_counter is None:
+            return super().connect()
+
+        start = perf_counter()
+        try:
+            return super().connect()
+        finally:
+            query_counter.pool_wait += perf_counter() - start
+
+
+def install_query_counter(engine: AsyncEngine) -> None:
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_query(*_):
+        query_counter = current_query_counter.get()
+        if query_counter is not None:
+            query_counter.queries += 1
+
+    @event.listens_for(engine.sync_engine.pool, "checkout")
+    def count_checkout(*_):
+        query_counter = current_query_counter.get()
+        if query_counter is not None:
+            query_counter.checkouts += 1
+
+    if N_PLUS_ONE_THRESHOLD:
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def count_statement(connection, cursor, statement, parameters, context, executemany):
+            query_counter = current_query_counter.get()
+            if query_counter is not None:
+                query_counter.statements[statement] += 1
+
+    if SQL_STATS or SLOW_QUERY_MS:
+        # On the execution context rather than the connection, failed statements never reach after_cursor_execute
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def start_timer(connection, cursor, statement, parameters, context, executemany):
+            context.query_start = perf_counter()
+
+        @event.listens_for(engine.sync_engine, "after_cursor_execute")
+        def stop_timer(connection, cursor, statement, parameters, context, executemany):
+            duration = perf_counter() - context.query_start
+
+            query_counter = current_query_counter.get()
+            if query_counter is not None:
+                query_counter.duration += duration
+
+            if SLOW_QUERY_MS and duration * 1000 >= SLOW_QUERY_MS:
+                route = query_counter.route if query_counter is not None else "-"
+                logger.warning(
+                    "Slow query on %s, %.1f ms: %s",
+                    route,
+                    duration * 1000,
+                    shorten(statement),
+                    extra={"route": route, "duration_ms": round(duration * 1000, 1), "statement": statement},
+                )
@@ -0,0 +1,83 @@
+"""Schema migrations, managed with Alembic in api/db/migrations.
+
+Migrations run once per deployment, before the workers start: `alembic upgrade head` from the repository root. The
+workers only check at startup that the database is at the revision their code expects, without importing Alembic,
+which would add to the startup time of every worker.
+"""
+
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from sqlalchemy import Connection, text
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import SQLModel
+
+from .db import engine, is_in_memory
+
+if TYPE_CHECKING:
+    from alembic.config import Config
+
+# The latest migration, update it with every new one. Migrations refuse to run while it is out of date.
+SCHEMA_REVISION = "0004"
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+def get_alembic_config() -> "Config":
+    from alembic.config import Config
+
+    config = Config()
+    config.set_main_option("script_location", str(Path(__file__).parent / "migrations"))
+
+    return config
+
+
+async def migrate() -> None:
+    """Upgrades the database to the latest revision, like `alembic upgrade head`. For scratch databases."""
+    from alembic import command
+
+    def upgrade(connection: Connection) -> None:
+        config = get_alembic_config()
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+
+    async with engine.begin() as connection:
+        await connection.run_sync(upgrade)
+
+
+async def get_schema_revision() -> str | None:
+    """The revision the database was migrated to, None if it never was. One query."""
+    async with engine.connect() as connection:
+        try:
+            return (await connection.execute(text("SELECT version_num FROM alembic_version"))).scalar()
+        except DBAPIError:
+            return None
+
+
+async def check_schema_version() -> None:
+    """Raises SchemaVersionError unless the database is at SCHEMA_REVISION."""
+    revision = await get_schema_revision()
+    if revision != SCHEMA_REVISION:
+        raise SchemaVersionError(
+            f"Database schema is at revision {revision}, this code needs {SCHEMA_REVISION}, run `alembic upgrade head`"
+        )
+
+
+async def prepare_schema() -> None:
+    """Startup check of the schema, see check_schema_version.
+
+    An in-memory database starts out empty and lives only in this process, so nothing else could have migrated it.
+    It gets the tables of the models instead, marked with SCHEMA_REVISION, much faster than running the migrations.
+    `alembic check` tells if the models and the migrations differ.
+    """
+    if is_in_memory(engine.url) and await get_schema_revision() is None:
+        async with engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all)
+            await connection.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) PRIMARY KEY)"))
+            await connection.execute(
+                text("INSERT INTO alembic_version (version_num) VALUES (:revision)"), {"revision": SCHEMA_REVISION}
+            )
+
+    await check_schema_version()
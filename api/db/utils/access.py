@@ -0,0 +1,126 @@
+from dataclasses import dataclass
+from os import getenv
+from typing import TYPE_CHECKING, Union
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import api.cache
+
+if TYPE_CHECKING:
+    from .. import Board, Column, Task
+
+
+@dataclass(frozen=True)
+class BoardAccess:
+    owner_id: int
+    member_ids: frozenset[int]
+
+    def allows(self, user_id: int | None) -> bool:
+        return user_id == self.owner_id or user_id in self.member_ids
+
+
+# Other workers only notice membership changes when their entries expire, keep the TTL short
+ACCESS_CACHE_SIZE = int(getenv("ACCESS_CACHE_SIZE", "10000"))
+ACCESS_CACHE_TTL = float(getenv("ACCESS_CACHE_TTL", "30"))
+
+board_access_cache: api.cache.TTLCache[int, BoardAccess] = api.cache.TTLCache(ACCESS_CACHE_SIZE, ACCESS_CACHE_TTL)
+# Columns and tasks never change boards, these only go stale when rows are deleted
+column_board_cache: api.cache.TTLCache[int, int] = api.cache.TTLCache(ACCESS_CACHE_SIZE, ACCESS_CACHE_TTL)
+task_column_cache: api.cache.TTLCache[int, int] = api.cache.TTLCache(ACCESS_CACHE_SIZE, ACCESS_CACHE_TTL)
+
+
+async def get_board_access(session: AsyncSession, board_id: int) -> BoardAccess | None:
+    """Owner and members of the board, None if it doesn't exist."""
+    from .. import Board, BoardUserAccess
+
+    board_access = board_access_cache.get(board_id)
+    if board_access is not None:
+        return board_access
+
+    owner_id = (await session.exec(select(Board.owner_id).where(Board.id == board_id))).first()
+    if owner_id is None:
+        return None
+
+    member_ids = (await session.exec(
+        select(BoardUserAccess.user_id).where(BoardUserAccess.board_id == board_id)
+    )).all()
+
+    board_access = BoardAccess(owner_id=owner_id, member_ids=frozenset(member_ids))
+    board_access_cache.set(board_id, board_access)
+
+    return board_access
+
+
+def get_cached_column_board_id(column_id: int) -> int | None:
+    return column_board_cache.get(column_id)
+
+
+def get_cached_task_board_id(task_id: int) -> int | None:
+    column_id = task_column_cache.get(task_id)
+    if column_id is None:
+        return None
+
+    return column_board_cache.get(column_id)
+
+
+async def get_column_and_board(session: AsyncSession, column_id: int) -> Union[tuple["Column", "Board"], None]:
+    from .. import Board, Column
+
+    row = (await session.exec(
+        select(Column, Board)
+        .join(Board)
+        .where(Column.id == column_id)
+    )).first()
+    if row is None:
+        return None
+
+    column, board = row
+    column_board_cache.set(column_id, board.id)
+
+    return column, board
+
+
+async def get_task_column_and_board(
+    session: AsyncSession,
+    task_id: int
+) -> Union[tuple["Task", "Column", "Board"], None]:
+    from .. import Board, Column, Task
+
+    row = (await session.exec(
+        select(Task, Column, Board)
+        .join(Column, Task.column_id == Column.id)
+        .join(Board, Column.board_id == Board.id)
+        .where(Task.id == task_id)
+    )).first()
+    if row is None:
+        return None
+
+    task, column, board = row
+    task_column_cache.set(task_id, column.id)
+    column_board_cache.set(column.id, board.id)
+
+    return task, column, board
+
+
+def _forget(session: AsyncSession, cache: api.cache.TTLCache, key: int) -> None:
+    # Again after commit, a concurrent request may have cached the old state in between
+    from .. import on_commit
+
+    cache.pop(key)
+    on_commit(session, lambda: cache.pop(key))
+
+
+def invalidate_board_access(session: AsyncSession, board_id: int | None) -> None:
+    if board_id is not None:
+        _forget(session, board_access_cache, board_id)
+
+
+def invalidate_column(session: AsyncSession, column_id: int | None) -> None:
+    if column_id is not None:
+        _forget(session, column_board_cache, column_id)
+
+
+def invalidate_task(session: AsyncSession, task_id: int | None) -> None:
+    if task_id is not None:
+        _forget(session, task_column_cache, task_id)
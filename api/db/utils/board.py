@@ -1,117 +1,193 @@
 from typing import TYPE_CHECKING, Any
 
-from sqlmodel import Session, select
+from sqlalchemy import CompoundSelect, case, union, update
+from sqlalchemy.orm import joinedload, selectinload
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .access import invalidate_board_access
+from .changes import add_tombstones, next_revision, next_revisions
+from .pagination import Pagination, paginate
+from .versions import update_versioned
 
 if TYPE_CHECKING:
     from .. import Board, BoardUserAccess, User
 
 
-def get_owned_boards(user_id: int | None) -> list["Board"]:
-    from .. import engine, Board
+async def get_owned_boards(
+    session: AsyncSession,
+    user_id: int | None,
+    pagination: Pagination
+) -> tuple[list["Board"], str | None]:
+    from .. import Board
 
-    with Session(engine) as session:
-        return list(
-            session.exec(
-                select(Board).where(
-                    Board.owner_id == user_id
-                )
-            ).all()
-        )
+    return await paginate(
+        session,
+        select(Board).where(
+            Board.owner_id == user_id
+        ),
+        order_by=[col(Board.id)],
+        key=lambda board: [board.id],
+        pagination=pagination,
+    )
 
 
-def get_shared_boards(user_id: int | None) -> list["Board"]:
-    from .. import engine, Board, BoardUserAccess
+async def get_shared_boards(
+    session: AsyncSession,
+    user_id: int | None,
+    pagination: Pagination
+) -> tuple[list["Board"], str | None]:
+    from .. import Board
 
-    with Session(engine) as session:
-        shared = list(
-            session.exec(
-                select(Board)
-                .join(BoardUserAccess)
-                .where(BoardUserAccess.user_id == user_id)
-            ).all()
-        )
+    # Owned boards first
+    is_shared = case((Board.owner_id == user_id, 0), else_=1)
+
+    return await paginate(
+        session,
+        select(Board).where(col(Board.id).in_(get_user_board_ids(user_id))),
+        order_by=[is_shared, col(Board.id)],
+        key=lambda board: [0 if board.owner_id == user_id else 1, board.id],
+        pagination=pagination,
+    )
+
+
+def get_user_board_ids(user_id: int | None) -> CompoundSelect:
+    """The ids of the boards the user owns or was added to, as a subquery."""
+    from .. import Board, BoardUserAccess
+
+    # A UNION of two index lookups instead of an OR the planner can't index
+    return union(
+        select(Board.id).where(Board.owner_id == user_id),
+        select(BoardUserAccess.board_id).where(BoardUserAccess.user_id == user_id),
+    )
+
+
+async def touch_user_boards(session: AsyncSession, user_id: int) -> list[int]:
+    """Gives the boards the user owns or was added to a new revision, after a change to the user they show.
 
-        return get_owned_boards(user_id) + shared
+    Stamps the user's memberships with it, so the board changes list the user again. Returns the ids of the boards.
+    """
+    from .. import Board, BoardUserAccess
 
+    board_ids = sorted(await next_revisions(session, get_user_board_ids(user_id)))
+    await session.exec(
+        update(BoardUserAccess)
+        .where(BoardUserAccess.user_id == user_id)
+        .values(revision=select(Board.revision).where(Board.id == BoardUserAccess.board_id).scalar_subquery())
+    )
 
-def create_board(owner: "User", **kwargs) -> "Board":
-    from .. import engine, Board
+    return board_ids
 
-    with Session(engine) as session:
-        new_board = Board(owner_id=owner.id, **kwargs)
-        session.add(new_board)
-        session.commit()
-        session.refresh(new_board)
 
-        return new_board
+async def create_board(session: AsyncSession, owner: "User", **kwargs) -> "Board":
+    from .. import Board
 
+    new_board = Board(owner_id=owner.id, **kwargs)
+    session.add(new_board)
+    await session.flush()
 
-def update_board(session: Session, board: "Board", update: dict[str, Any]) -> "Board":
-    board.sqlmodel_update(update)
-    session.add(board)
-    session.commit()
-    session.refresh(board)
+    return new_board
+
+
+async def get_full_board(session: AsyncSession, board: "Board") -> "Board":
+    """Loads the board with its owner, members, columns and their tasks in a constant number of queries."""
+    from .. import Board, Column
+
+    return (await session.exec(
+        select(Board)
+        .where(Board.id == board.id)
+        .options(
+            joinedload(Board.owner),
+            selectinload(Board.members),
+            selectinload(Board.columns).selectinload(Column.tasks),
+        )
+        .execution_options(populate_existing=True)
+    )).one()
+
+
+async def update_board(
+    session: AsyncSession,
+    board: "Board",
+    update: dict[str, Any],
+    version: int | None = None
+) -> "Board":
+    """Raises VersionConflictError if `version` is given and the board was changed since."""
+    await next_revision(session, board.id)
+    await update_versioned(session, board, update, version)
 
     return board
 
 
-def delete_board(session: Session, board: "Board") -> None:
-    session.delete(board)
-    session.commit()
+async def delete_board(session: AsyncSession, board: "Board") -> None:
+    await session.delete(board)
+    await session.flush()
 
+    invalidate_board_access(session, board.id)
 
-def get_users(board: "Board") -> list["User"]:
-    from .. import engine, BoardUserAccess, User
 
-    with Session(engine) as session:
-        board_user_accesses = session.exec(
-            select(BoardUserAccess).where(
-                BoardUserAccess.board_id == board.id
-            )
-        ).all()
+async def get_users(
+    session: AsyncSession,
+    board: "Board",
+    pagination: Pagination
+) -> tuple[list["User"], str | None]:
+    from .. import Board, BoardUserAccess, User
 
-        result: list[Any] = [session.get(User, board.owner_id)]
-        for board_user_access in board_user_accesses:
-            result.append(session.get(User, board_user_access.user_id))
+    user_ids = union(
+        select(Board.owner_id).where(Board.id == board.id),
+        select(BoardUserAccess.user_id).where(BoardUserAccess.board_id == board.id),
+    )
+    # Owner first, then members
+    is_member = case((User.id == board.owner_id, 0), else_=1)
+
+    return await paginate(
+        session,
+        select(User).where(col(User.id).in_(user_ids)),
+        order_by=[is_member, col(User.id)],
+        key=lambda user: [0 if user.id == board.owner_id else 1, user.id],
+        pagination=pagination,
+    )
+
+
+async def add_user(session: AsyncSession, board: "Board", user_id: int) -> "BoardUserAccess":
+    from .. import BoardUserAccess
+
+    old_board_user_access = (await session.exec(
+        select(BoardUserAccess).where(
+            BoardUserAccess.board_id == board.id,
+            BoardUserAccess.user_id == user_id
+        )
+    )).first()
 
-        return result
+    if old_board_user_access is not None:
+        return old_board_user_access
 
+    revision = await next_revision(session, board.id)
 
-def add_user(board: "Board", user_id: int) -> "BoardUserAccess":
-    from .. import engine, BoardUserAccess
+    board_user_access = BoardUserAccess(board_id=board.id, user_id=user_id, revision=revision)
+    session.add(board_user_access)
+    await session.flush()
 
-    with Session(engine) as session:
-        old_board_user_access = session.exec(
-            select(BoardUserAccess).where(
-                BoardUserAccess.board_id == board.id,
-                BoardUserAccess.user_id == user_id
-            )
-        ).first()
+    invalidate_board_access(session, board.id)
 
-        if old_board_user_access is not None:
-            return old_board_user_access
+    return board_user_access
 
-        board_user_access = BoardUserAccess(board_id=board.id, user_id=user_id)
-        session.add(board_user_access)
-        session.commit()
-        session.refresh(board_user_access)
 
-        return board_user_access
+async def remove_user(session: AsyncSession, board: "Board", user_id: int) -> None:
+    from .. import BoardUserAccess
 
+    board_user_access = (await session.exec(
+        select(BoardUserAccess).where(
+            BoardUserAccess.board_id == board.id,
+            BoardUserAccess.user_id == user_id
+        )
+    )).first()
 
-def remove_user(board: "Board", user_id: int) -> None:
-    from .. import engine, BoardUserAccess
+    if board_user_access is None:
+        return
 
-    with Session(engine) as session:
-        board_user_access = session.exec(
-            select(BoardUserAccess).where(
-                BoardUserAccess.board_id == board.id,
-                BoardUserAccess.user_id == user_id
-            )
-        ).first()
+    revision = await next_revision(session, board.id)
 
-        if board_user_access is None:
-            return
+    await session.delete(board_user_access)
+    await add_tombstones(session, board.id, "member", [user_id], revision)
 
-        session.delete(board_user_access)
-        session.commit()
+    invalidate_board_access(session, board.id)
@@ -0,0 +1,127 @@
+"""Per-board revisions for incremental sync.
+
+Every transaction that changes a board bumps its revision once and stamps the columns, tasks and memberships it changes
+with the new value, deleted ones leave a Tombstone. A change to a user does the same for every board showing the user.
+A client that has seen revision N then only needs what is above N.
+"""
+
+from typing import TYPE_CHECKING, Any, Iterable
+
+from sqlalchemy import case, union, update
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+if TYPE_CHECKING:
+    from .. import Board, Column, Task, Tombstone, User
+
+
+async def next_revision(session: AsyncSession, board_id: int) -> int:
+    """The revision the current transaction's changes to the board get.
+
+    The first call in a transaction bumps the board's revision, which locks the board row until the transaction
+    ends. Revisions are therefore committed in order, a client that has seen revision N can't miss a change
+    committed later with a lower one. Call it before taking any other lock for the change, so locks are always
+    taken board first.
+    """
+    from .. import Board
+
+    revisions = session.info.setdefault("revisions", {})
+    if board_id not in revisions:
+        revisions[board_id] = (await session.exec(
+            update(Board)
+            .where(Board.id == board_id)
+            .values(revision=Board.revision + 1)
+            .returning(Board.revision)
+        )).scalar_one()
+
+    return revisions[board_id]
+
+
+async def next_revisions(session: AsyncSession, board_ids: Any) -> dict[int, int]:
+    """next_revision for every board the `board_ids` subquery selects, in one statement. Returns the revisions by
+    board id.
+
+    The boards are locked in the order of their ids, so concurrent calls over the same boards can't deadlock. Boards
+    already changed in the transaction keep their revision.
+    """
+    from .. import Board
+
+    revisions = session.info.setdefault("revisions", {})
+    locked_ids = (
+        select(Board.id).where(col(Board.id).in_(board_ids)).order_by(col(Board.id)).with_for_update(key_share=True)
+    )
+    board_revisions = dict((await session.exec(
+        update(Board)
+        .where(col(Board.id).in_(locked_ids))
+        .values(revision=case((col(Board.id).in_(list(revisions)), Board.revision), else_=Board.revision + 1))
+        .returning(Board.id, Board.revision)
+    )).all())
+    revisions.update(board_revisions)
+
+    return board_revisions
+
+
+def get_pending_revision(session: AsyncSession, board_id: int) -> int | None:
+    """The revision next_revision gave the board in the current transaction, None if it wasn't changed."""
+    return session.info.get("revisions", {}).get(board_id)
+
+
+async def get_revision(session: AsyncSession, board_id: int) -> int | None:
+    """The board's committed revision, None if it doesn't exist."""
+    from .. import Board
+
+    return (await session.exec(select(Board.revision).where(Board.id == board_id))).first()
+
+
+async def add_tombstones(
+    session: AsyncSession,
+    board_id: int,
+    kind: str,
+    item_ids: Iterable[int | None],
+    revision: int
+) -> None:
+    from .. import Tombstone
+
+    session.add_all([
+        Tombstone(board_id=board_id, kind=kind, item_id=item_id, revision=revision) for item_id in item_ids
+    ])
+    await session.flush()
+
+
+async def get_changes(
+    session: AsyncSession,
+    board: "Board",
+    since: int
+) -> tuple[int, list["Column"], list["Task"], list["User"], list["Tombstone"]]:
+    """The board's revision, and the columns, tasks, users and tombstones changed after revision `since`.
+
+    Tasks of deleted columns are deleted with them, they only leave the column's tombstone. A member removed and added
+    again has both a tombstone and a membership after `since`, the membership is the later change.
+    """
+    from .. import Board, BoardUserAccess, Column, Task, Tombstone, User
+
+    # Read the revision first, everything up to it is committed by now. Rows of later revisions may show up below
+    # too, they are sent again on the next poll.
+    revision = await get_revision(session, board.id)
+    assert revision is not None
+
+    columns = (await session.exec(
+        select(Column).where(Column.board_id == board.id, Column.revision > since).order_by(col(Column.position))
+    )).all()
+    tasks = (await session.exec(
+        select(Task)
+        .join(Column)
+        .where(Column.board_id == board.id, Task.revision > since)
+        .order_by(col(Task.column_id), col(Task.position))
+    )).all()
+    # The owner isn't stamped with revisions, it is always sent
+    user_ids = union(
+        select(Board.owner_id).where(Board.id == board.id),
+        select(BoardUserAccess.user_id).where(BoardUserAccess.board_id == board.id, BoardUserAccess.revision > since),
+    )
+    users = (await session.exec(select(User).where(col(User.id).in_(user_ids)).order_by(col(User.id)))).all()
+    tombstones = (await session.exec(
+        select(Tombstone).where(Tombstone.board_id == board.id, Tombstone.revision > since).order_by(col(Tombstone.id))
+    )).all()
+
+    return revision, list(columns), list(tasks), list(users), list(tombstones)
@@ -1,52 +1,159 @@
 from typing import TYPE_CHECKING, Any, Union
 
-from sqlmodel import Session, select
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .access import invalidate_column
+from .changes import add_tombstones, next_revision
+from .ordering import CROWDED_GAP, get_append_position, get_position_between, rebalance_positions
+from .pagination import Pagination, paginate
+from .versions import VersionConflictError, update_versioned
 
 if TYPE_CHECKING:
     from .. import Board, Column
 
 
-def get_columns(board: "Board") -> list["Column"]:
-    from .. import engine, Column
+async def get_columns(
+    session: AsyncSession,
+    board: "Board",
+    pagination: Pagination
+) -> tuple[list["Column"], str | None]:
+    from .. import Column
 
-    with Session(engine) as session:
-        return list(
-            session.exec(
-                select(Column).where(
-                    Column.board_id == board.id
-                )
-            ).all()
-        )
+    return await paginate(
+        session,
+        select(Column).where(
+            Column.board_id == board.id
+        ),
+        order_by=[col(Column.position)],
+        key=lambda column: [column.position],
+        pagination=pagination,
+    )
 
 
-def get_column_by_id(column_id: int) -> Union["Column", None]:
-    from .. import engine, Column
+async def get_column_by_id(session: AsyncSession, column_id: int) -> Union["Column", None]:
+    from .. import Column
 
-    with Session(engine) as session:
-        return session.get(Column, column_id)
+    return await session.get(Column, column_id)
 
 
-def create_column(board: "Board", **kwargs) -> "Column":
-    from .. import engine, Column
+async def get_columns_by_ids(session: AsyncSession, board: "Board", column_ids: set[int]) -> dict[int, "Column"]:
+    """The columns of the board among `column_ids`, by id. Ids of missing columns or of other boards are left out."""
+    from .. import Column
 
-    with Session(engine) as session:
-        new_column = Column(board_id=board.id, position=len(get_columns(board)), **kwargs)
-        session.add(new_column)
-        session.commit()
-        session.refresh(new_column)
+    if not column_ids:
+        return {}
 
-        return new_column
+    columns = (await session.exec(
+        select(Column).where(col(Column.id).in_(column_ids), Column.board_id == board.id)
+    )).all()
 
+    return {column.id: column for column in columns}
 
-def update_column(session: Session, column: "Column", update: dict[str, Any]) -> "Column":
-    column.sqlmodel_update(update)
+
+async def get_column_by_position(session: AsyncSession, board: "Board", position: int) -> Union["Column", None]:
+    from .. import Column
+
+    return (await session.exec(
+        select(Column).where(
+            Column.board_id == board.id,
+            Column.position == position
+        )
+    )).first()
+
+
+async def create_column(session: AsyncSession, board: "Board", **kwargs) -> "Column":
+    from .. import Column
+
+    # Also locks the board, for the position
+    revision = await next_revision(session, board.id)
+    position = await get_append_position(session, Column, Column.position, Column.board_id == board.id, revision)
+
+    new_column = Column(board_id=board.id, position=position, revision=revision, **kwargs)
+    session.add(new_column)
+    await session.flush()
+
+    return new_column
+
+
+async def move_column(
+    session: AsyncSession,
+    column: "Column",
+    after: Union["Column", None],
+    before: Union["Column", None],
+) -> bool:
+    """Moves the column right after `after` and/or right before `before`, or to the end.
+
+    Returns whether the board got crowded and should be rebalanced soon with rebalance_column_positions. Raises
+    VersionConflictError if the neighbours were moved apart since they were loaded.
+    """
+    from .. import Column
+
+    # Also locks the board, for the positions
+    revision = await next_revision(session, column.board_id)
+
+    # They were loaded before the lock, a concurrent change may have changed them since
+    await session.exec(
+        select(Column)
+        .where(col(Column.id).in_([item.id for item in (column, after, before) if item is not None]))
+        .execution_options(populate_existing=True)
+    )
+    if after is not None and before is not None and after.position >= before.position:
+        raise VersionConflictError("The neighbours of the column were moved since")
+
+    siblings = (Column.board_id == column.board_id) & (Column.id != column.id)
+    after_position = after.position if after is not None else None
+    before_position = before.position if before is not None else None
+
+    placement = await get_position_between(session, Column.position, siblings, after_position, before_position)
+    if placement is None:
+        await rebalance_positions(session, Column, Column.position, Column.board_id == column.board_id, revision)
+        for rebalanced_column in (column, after, before):
+            if rebalanced_column is not None:
+                await session.refresh(rebalanced_column, ["position", "revision", "version", "updated_at"])
+
+        after_position = after.position if after is not None else None
+        before_position = before.position if before is not None else None
+        placement = await get_position_between(session, Column.position, siblings, after_position, before_position)
+        assert placement is not None
+
+    position, gap = placement
+    column.position = position
+    column.revision = revision
+    column.version += 1
     session.add(column)
-    session.commit()
-    session.refresh(column)
+    await session.flush()
+
+    return gap < CROWDED_GAP
+
+
+async def rebalance_column_positions(board_id: int) -> None:
+    """Background job, runs in its own transaction."""
+    from .. import engine, Column
+
+    async with AsyncSession(engine) as session:
+        revision = await next_revision(session, board_id)
+        await rebalance_positions(session, Column, Column.position, Column.board_id == board_id, revision)
+        await session.commit()
+
+
+async def update_column(
+    session: AsyncSession,
+    column: "Column",
+    update: dict[str, Any],
+    version: int | None = None
+) -> "Column":
+    """Raises VersionConflictError if `version` is given and the column was changed since."""
+    revision = await next_revision(session, column.board_id)
+    await update_versioned(session, column, dict(update, revision=revision), version)
 
     return column
 
 
-def delete_column(session: Session, column: "Column") -> None:
-    session.delete(column)
-    session.commit()
+async def delete_column(session: AsyncSession, column: "Column") -> None:
+    revision = await next_revision(session, column.board_id)
+
+    await session.delete(column)
+    await add_tombstones(session, column.board_id, "column", [column.id], revision)
+
+    invalidate_column(session, column.id)
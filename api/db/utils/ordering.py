@@ -0,0 +1,139 @@
+"""Gapped integer ranks for Column.position and Task.position.
+
+Siblings are spaced POSITION_STEP apart, so an item can be moved between two others by giving it the midpoint of
+their positions, which updates exactly one row. Only when two neighbours end up adjacent are the siblings renumbered.
+Positions are never negative, rebalancing relies on that. Appending always goes past the last sibling, so the siblings
+are also renumbered before a position would go past MAX_POSITION.
+"""
+
+from typing import Any
+
+from sqlalchemy import BigInteger, cast, func, update
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlmodel import SQLModel, col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .versions import VersionConflictError
+
+POSITION_STEP = 1024
+# Gaps below this are worth a rebalance in the background before the next move has to do it inline
+CROWDED_GAP = POSITION_STEP // 64
+# The position columns are INTEGER, 32 bits on PostgreSQL
+MAX_POSITION = 2 ** 31 - 1
+
+
+async def lock_parent(session: AsyncSession, parent: type[SQLModel], parent_id: int | None) -> None:
+    """Serialises position changes among the children of one board or column until the transaction ends.
+
+    Takes FOR NO KEY UPDATE on the parent row, which doesn't block foreign key checks against it.
+    A no-op on SQLite, which serialises writers anyway.
+    """
+    await session.exec(
+        select(parent.id).where(parent.id == parent_id).with_for_update(key_share=True)
+    )
+
+
+async def get_next_position(session: AsyncSession, position: InstrumentedAttribute[int], parent: Any) -> int:
+    """The position after the last sibling, `parent` is the filter selecting the siblings.
+
+    Lock the parent with lock_parent first, or concurrent inserts can get the same position.
+    """
+    # Widened, the last position may be close enough to MAX_POSITION for the sum to overflow INTEGER
+    last_position = cast(func.max(position), BigInteger)
+
+    return (await session.exec(
+        select(func.coalesce(last_position + POSITION_STEP, POSITION_STEP)).where(parent)
+    )).one()
+
+
+async def get_append_position(
+    session: AsyncSession,
+    model: type[SQLModel],
+    position: InstrumentedAttribute[int],
+    parent: Any,
+    revision: int,
+    count: int = 1,
+) -> int:
+    """get_next_position with room for `count` items POSITION_STEP apart, rebalancing the siblings if there is none.
+
+    The rebalance is stamped with `revision` and doesn't update loaded instances, see rebalance_positions.
+    """
+    next_position = await get_next_position(session, position, parent)
+    if next_position + (count - 1) * POSITION_STEP > MAX_POSITION:
+        await rebalance_positions(session, model, position, parent, revision)
+        next_position = await get_next_position(session, position, parent)
+
+    return next_position
+
+
+async def get_position_between(
+    session: AsyncSession,
+    position: InstrumentedAttribute[int],
+    parent: Any,
+    after: int | None,
+    before: int | None,
+) -> tuple[int, int] | None:
+    """Picks a free position right after `after` and/or right before `before`.
+
+    Returns the position and the size of the gap it was taken from, or None if the neighbours are adjacent or there
+    is no room left after the last one. `parent` must exclude the item being moved, otherwise it could be its own
+    neighbour. Raises VersionConflictError if another sibling lies between `after` and `before`, the caller's view of
+    the order is outdated.
+    """
+    if after is None and before is None:
+        next_position = await get_next_position(session, position, parent)
+        return (next_position, POSITION_STEP) if next_position <= MAX_POSITION else None
+
+    if after is not None and before is not None and (await session.exec(
+        select(position).where(parent, position > after, position < before).limit(1)
+    )).first() is not None:
+        raise VersionConflictError("The neighbours were moved apart since")
+
+    lower = after
+    upper = before
+    if upper is None:
+        upper = (await session.exec(select(func.min(position)).where(parent, position > after))).one()
+        if upper is None:
+            return (lower + POSITION_STEP, POSITION_STEP) if lower + POSITION_STEP <= MAX_POSITION else None
+    if lower is None:
+        lower = (await session.exec(select(func.max(position)).where(parent, position < before))).one()
+        if lower is None:
+            lower = -1
+
+    if upper - lower < 2:
+        return None
+
+    return (lower + upper) // 2, upper - lower
+
+
+async def rebalance_positions(
+    session: AsyncSession,
+    model: type[SQLModel],
+    position: InstrumentedAttribute[int],
+    parent: Any,
+    revision: int,
+) -> None:
+    """Spreads the siblings POSITION_STEP apart again, keeping their order, stamps them with `revision` and bumps their
+    versions, which single item ETags are made of.
+
+    Loaded instances are not updated, refresh the ones still in use.
+    """
+    # Unique constraints are checked row by row, so move everything out of the way (to negative positions) first
+    await session.exec(
+        update(model)
+        .where(parent)
+        .values({position: -1 - position})
+        .execution_options(synchronize_session=False)
+    )
+
+    ranked = (
+        select(col(model.id).label("id"), func.row_number().over(order_by=position.desc()).label("rank"))
+        .where(parent)
+        .subquery()
+    )
+    await session.exec(
+        update(model)
+        .where(model.id == ranked.c.id)
+        .values({position: ranked.c.rank * POSITION_STEP, model.revision: revision, model.version: model.version + 1})
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,81 @@
+import base64
+import binascii
+from dataclasses import dataclass
+from datetime import datetime
+import json
+from typing import Any, Callable, TypeVar
+
+from sqlalchemy import ColumnElement, tuple_
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
+
+T = TypeVar("T")
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+@dataclass
+class Pagination:
+    limit: int
+    # Opaque cursor from a previous page's next_cursor
+    after: str | None = None
+
+
+def encode_cursor(values: list[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, default=datetime.isoformat).encode()).decode()
+
+
+def decode_cursor(cursor: str, order_by: list[ColumnElement[Any]]) -> list[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursorError("Malformed cursor")
+
+    if not isinstance(values, list) or len(values) != len(order_by):
+        raise InvalidCursorError("Cursor doesn't match this listing")
+
+    # JSON has no datetime, restore the types of the ordering columns
+    for index, (expression, value) in enumerate(zip(order_by, values)):
+        if expression.type.python_type is datetime:
+            try:
+                values[index] = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise InvalidCursorError("Cursor doesn't match this listing")
+        elif not isinstance(value, expression.type.python_type):
+            raise InvalidCursorError("Cursor doesn't match this listing")
+
+    return values
+
+
+async def paginate(
+    session: AsyncSession,
+    statement: SelectOfScalar[T],
+    order_by: list[ColumnElement[Any]],
+    key: Callable[[T], list[Any]],
+    pagination: Pagination,
+    descending: bool = False,
+) -> tuple[list[T], str | None]:
+    """Keyset pagination: returns one page of `statement` and the cursor of the next page, if there is one.
+
+    `order_by` must be unique for every row, `key` computes its values from a row. With `descending`, every expression
+    of `order_by` is in descending order, row comparisons can't mix directions.
+    """
+    if pagination.after is not None:
+        keyset, cursor = tuple_(*order_by), tuple_(*decode_cursor(pagination.after, order_by))
+        statement = statement.where(keyset < cursor if descending else keyset > cursor)
+
+    if descending:
+        statement = statement.order_by(*[expression.desc() for expression in order_by])
+    else:
+        statement = statement.order_by(*order_by)
+
+    # One extra row tells whether there is a next page
+    items = list((await session.exec(statement.limit(pagination.limit + 1))).all())
+    if len(items) <= pagination.limit:
+        return items, None
+
+    items = items[:pagination.limit]
+
+    return items, encode_cursor(key(items[-1]))
@@ -0,0 +1,113 @@
+"""Search of the tasks of a board, most relevant first.
+
+On PostgreSQL, every word of the query must start a word of the task's name or description, or of one of its log
+entries if asked. Names also match with typos, through their trigram similarity to the query. Both go through GIN
+indexes, so searching doesn't read the whole board. Other databases only find the tasks containing the query as is,
+with LIKE, reading them all.
+
+The words of the tasks and logs are in generated search_vector columns, also read to rank the matches, much faster
+than parsing the text again. They only exist on PostgreSQL, so they are added by migration 0002 rather than the models,
+which also create SQLite databases.
+"""
+
+import re
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import ColumnElement, Float, case, exists, func, literal, literal_column, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .pagination import Pagination, paginate
+
+if TYPE_CHECKING:
+    from .. import Board, Task
+
+# The "simple" configuration doesn't stem words, which works the same for every language. Migration 0002 uses it too.
+SEARCH_CONFIG = text("'simple'::regconfig")
+
+task_search_vector = literal_column("task.search_vector", TSVECTOR)
+task_log_search_vector = literal_column("tasklog.search_vector", TSVECTOR)
+
+
+async def search_tasks(
+    session: AsyncSession,
+    board: "Board",
+    query: str,
+    include_logs: bool,
+    pagination: Pagination,
+) -> tuple[list[tuple["Task", float]], str | None]:
+    """Returns one page of the matching (task, rank) pairs, by decreasing rank, and the cursor of the next page."""
+    from .. import Column, Task
+
+    if session.bind.dialect.name == "postgresql":
+        matches = get_text_search_matches(query, include_logs)
+    else:
+        matches = get_like_matches(query, include_logs)
+    if matches is None:
+        return [], None
+
+    condition, rank = matches
+
+    items, next_cursor = await paginate(
+        session,
+        select(Task, rank).join(Column).where(Column.board_id == board.id, condition),
+        order_by=[-rank, col(Task.id)],
+        key=lambda row: [-row[1], row[0].id],
+        pagination=pagination,
+    )
+
+    return [(task, rank) for task, rank in items], next_cursor
+
+
+def get_text_search_matches(
+    query: str,
+    include_logs: bool,
+) -> tuple[ColumnElement[bool], ColumnElement[float]] | None:
+    from .. import Task, TaskLog
+
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+
+    # Only words, so the query can't break the tsquery syntax
+    ts_query = func.to_tsquery(SEARCH_CONFIG, " & ".join(f"{word}:*" for word in words))
+
+    # Conditions on indexed columns only, which PostgreSQL combines with a bitmap OR of the index scans
+    condition = task_search_vector.op("@@")(ts_query) | literal(query).op("<%")(Task.name)
+    rank = func.ts_rank(task_search_vector, ts_query, type_=Float) + func.word_similarity(query, Task.name, type_=Float)
+
+    if include_logs:
+        log_matches = task_log_search_vector.op("@@")(ts_query)
+        # Evaluated once, the ids then go through the primary key index. A plain IN (subquery) gets planned as a join
+        # that scans every task.
+        log_task_ids = func.array(select(TaskLog.task_id).where(log_matches).scalar_subquery())
+        condition = condition | (col(Task.id) == func.any(log_task_ids))
+        # Lower than matches in the task itself, log entries carry the default weight D
+        log_rank = (
+            select(func.max(func.ts_rank(task_log_search_vector, ts_query, type_=Float)))
+            .where(TaskLog.task_id == Task.id, log_matches)
+            .scalar_subquery()
+        )
+        rank = rank + func.coalesce(log_rank, 0)
+
+    return condition, rank
+
+
+def get_like_matches(query: str, include_logs: bool) -> tuple[ColumnElement[bool], ColumnElement[float]]:
+    from .. import Task, TaskLog
+
+    pattern = "%" + re.sub(r"([\\%_])", r"\\\1", query) + "%"
+
+    def contains(text: Any) -> ColumnElement[bool]:
+        return col(text).ilike(pattern, escape="\\")
+
+    condition = contains(Task.name) | contains(Task.description)
+    rank = case((contains(Task.name), 1.0), else_=0.0) + case((contains(Task.description), 0.5), else_=0.0)
+
+    if include_logs:
+        log_matches = exists().where(TaskLog.task_id == Task.id, contains(TaskLog.content))
+        condition = condition | log_matches
+        rank = rank + case((log_matches, 0.1), else_=0.0)
+
+    return condition, rank
@@ -1,70 +1,414 @@
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, Union
 
-from sqlmodel import Session, select
+from sqlalchemy import ColumnElement, delete, or_
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
+
+from .access import invalidate_task
+from .board import get_user_board_ids
+from .changes import add_tombstones, next_revision
+from .ordering import (
+    CROWDED_GAP,
+    POSITION_STEP,
+    get_append_position,
+    get_position_between,
+    lock_parent,
+    rebalance_positions,
+)
+from .pagination import Pagination, paginate
+from .versions import VersionConflictError, update_versioned
 
 if TYPE_CHECKING:
-    from .. import Column, Task, TaskLog
+    from .. import Board, Column, Task, TaskLog, User
+
+
+def get_task_conditions(filter: dict[str, Any]) -> list[ColumnElement[bool]]:
+    """The conditions of a task filter, see api.schemas.TaskFilter and its subclasses. Empty values don't filter.
+
+    A board_id filter needs the columns of the tasks joined.
+    """
+    from .. import Column, Task
+
+    conditions = []
+
+    assignee_ids = filter.get("assignee_id") or []
+    if assignee_ids and filter.get("unassigned"):
+        conditions.append(or_(col(Task.assignee_id).in_(assignee_ids), col(Task.assignee_id).is_(None)))
+    elif assignee_ids:
+        conditions.append(col(Task.assignee_id).in_(assignee_ids))
+    elif filter.get("unassigned"):
+        conditions.append(col(Task.assignee_id).is_(None))
+
+    if filter.get("created_by") is not None:
+        conditions.append(Task.created_by == filter["created_by"])
+    if filter.get("created_after") is not None:
+        conditions.append(Task.created_at >= filter["created_after"])
+    if filter.get("created_before") is not None:
+        conditions.append(Task.created_at < filter["created_before"])
+    if filter.get("column_id"):
+        conditions.append(col(Task.column_id).in_(filter["column_id"]))
+    if filter.get("board_id"):
+        conditions.append(col(Column.board_id).in_(filter["board_id"]))
+
+    return conditions
+
+
+async def get_tasks(
+    session: AsyncSession,
+    column: "Column",
+    filter: dict[str, Any],
+    sort: str,
+    pagination: Pagination
+) -> tuple[list["Task"], str | None]:
+    """The tasks of the column matching `filter`, in the order of `sort`, see api.schemas.TaskSort."""
+    from .. import Task
+
+    statement = select(Task).where(Task.column_id == column.id, *get_task_conditions(filter))
+
+    if sort == "position":
+        return await paginate(
+            session,
+            statement,
+            order_by=[col(Task.position)],
+            key=lambda task: [task.position],
+            pagination=pagination,
+        )
+
+    return await paginate(
+        session,
+        statement,
+        order_by=[col(Task.created_at), col(Task.id)],
+        key=lambda task: [task.created_at, task.id],
+        pagination=pagination,
+        descending=sort.startswith("-"),
+    )
+
+
+async def get_board_tasks(
+    session: AsyncSession,
+    board: "Board",
+    filter: dict[str, Any],
+    sort: str,
+    pagination: Pagination
+) -> tuple[list[tuple["Task", "Column"]], str | None]:
+    """The tasks of the board matching `filter`, with their columns, in one query whatever the columns."""
+    from .. import Column, Task
+
+    return await paginate_tasks_with_columns(
+        session,
+        select(Task, Column).join(Column).where(Column.board_id == board.id, *get_task_conditions(filter)),
+        sort,
+        pagination,
+    )
+
+
+async def get_assigned_tasks(
+    session: AsyncSession,
+    user: "User",
+    filter: dict[str, Any],
+    sort: str,
+    pagination: Pagination
+) -> tuple[list[tuple["Task", "Column"]], str | None]:
+    """The tasks assigned to the user on every board they can still access, with their columns."""
+    from .. import Column, Task
+
+    return await paginate_tasks_with_columns(
+        session,
+        select(Task, Column).join(Column).where(
+            Task.assignee_id == user.id,
+            # Users removed from a board stay assigned to its tasks until someone reassigns them
+            col(Column.board_id).in_(get_user_board_ids(user.id)),
+            *get_task_conditions(filter),
+        ),
+        sort,
+        pagination,
+    )
+
 
+async def paginate_tasks_with_columns(
+    session: AsyncSession,
+    statement: SelectOfScalar[tuple["Task", "Column"]],
+    sort: str,
+    pagination: Pagination,
+) -> tuple[list[tuple["Task", "Column"]], str | None]:
+    from .. import Column, Task
 
-def get_tasks(column: "Column", filter: dict[str, Any]) -> list["Task"]:
-    from .. import engine, Task
+    if sort == "position":
+        return await paginate(
+            session,
+            statement,
+            order_by=[col(Column.board_id), col(Column.position), col(Task.position)],
+            key=lambda row: [row[1].board_id, row[1].position, row[0].position],
+            pagination=pagination,
+        )
+
+    return await paginate(
+        session,
+        statement,
+        order_by=[col(Task.created_at), col(Task.id)],
+        key=lambda row: [row[0].created_at, row[0].id],
+        pagination=pagination,
+        descending=sort.startswith("-"),
+    )
+
+
+async def get_tasks_by_ids(session: AsyncSession, board: "Board", task_ids: set[int]) -> dict[int, "Task"]:
+    """The tasks of the board among `task_ids`, by id. Ids of missing tasks or of other boards are left out."""
+    from .. import Column, Task
+
+    if not task_ids:
+        return {}
+
+    tasks = (await session.exec(
+        select(Task)
+        .join(Column)
+        .where(col(Task.id).in_(task_ids), Column.board_id == board.id)
+    )).all()
 
-    with Session(engine) as session:
-        return list(
-            session.exec(
-                select(Task).where(
-                    Task.column_id == column.id,
-                    *[getattr(Task, field_name) == value for field_name, value in filter.items()]
-                )
-            ).all()
+    return {task.id: task for task in tasks}
+
+
+async def get_task_by_position(session: AsyncSession, column: "Column", position: int) -> Union["Task", None]:
+    from .. import Task
+
+    return (await session.exec(
+        select(Task).where(
+            Task.column_id == column.id,
+            Task.position == position
         )
+    )).first()
+
+
+async def get_next_task_position(session: AsyncSession, column: "Column", count: int = 1) -> int:
+    """The position after the last task of the column, followed by room for `count` - 1 more tasks.
+
+    Locks the column until the end of the transaction, so the positions stay free for the caller.
+    """
+    from .. import Column, Task
+
+    # The board is locked before the column, see next_revision
+    revision = await next_revision(session, column.board_id)
+    await lock_parent(session, Column, column.id)
+
+    return await get_append_position(session, Task, Task.position, Task.column_id == column.id, revision, count)
+
+
+async def next_task_revision(session: AsyncSession, task: "Task") -> int:
+    """next_revision of the task's board, its column is usually loaded already."""
+    from .. import Column
+
+    column = await session.get(Column, task.column_id)
+    assert column is not None
+
+    return await next_revision(session, column.board_id)
+
+
+async def create_task(session: AsyncSession, column: "Column", **kwargs) -> "Task":
+    return (await create_tasks(session, column, [kwargs]))[0]
+
 
+async def create_tasks(session: AsyncSession, column: "Column", new_tasks: list[dict[str, Any]]) -> list["Task"]:
+    """Appends the tasks to the column in order, with a single multi-row INSERT."""
+    from .. import Task
 
-def create_task(column: "Column", **kwargs) -> "Task":
-    from .. import engine, Task
+    position = await get_next_task_position(session, column, len(new_tasks))
+    revision = await next_revision(session, column.board_id)
 
-    with Session(engine) as session:
-        new_task = Task(column_id=column.id, position=len(get_tasks(column, dict())), **kwargs)
-        session.add(new_task)
-        session.commit()
-        session.refresh(new_task)
+    tasks = []
+    for kwargs in new_tasks:
+        tasks.append(Task(column_id=column.id, position=position, revision=revision, **kwargs))
+        position += POSITION_STEP
 
-        return new_task
+    session.add_all(tasks)
+    await session.flush()
 
+    return tasks
 
-def update_task(session: Session, task: "Task", update: dict[str, Any]) -> "Task":
-    task.sqlmodel_update(update)
+
+async def move_task(
+    session: AsyncSession,
+    task: "Task",
+    column: "Column",
+    after: Union["Task", None],
+    before: Union["Task", None],
+) -> bool:
+    """Moves the task into `column` right after `after` and/or right before `before`, or to the end.
+
+    Returns whether the column got crowded and should be rebalanced soon with rebalance_task_positions. Raises
+    VersionConflictError if the neighbours were moved apart since they were loaded.
+    """
+    from .. import Column, Task
+
+    revision = await next_revision(session, column.board_id)
+    await lock_parent(session, Column, column.id)
+
+    # They were loaded before the lock, a concurrent move may have changed them since
+    await session.exec(
+        select(Task)
+        .where(col(Task.id).in_([item.id for item in (task, after, before) if item is not None]))
+        .execution_options(populate_existing=True)
+    )
+    if any(sibling.column_id != column.id for sibling in (after, before) if sibling is not None) or (
+        after is not None and before is not None and after.position >= before.position
+    ):
+        raise VersionConflictError("The neighbours of the task were moved since")
+
+    siblings = (Task.column_id == column.id) & (Task.id != task.id)
+    after_position = after.position if after is not None else None
+    before_position = before.position if before is not None else None
+
+    placement = await get_position_between(session, Task.position, siblings, after_position, before_position)
+    if placement is None:
+        await rebalance_positions(session, Task, Task.position, Task.column_id == column.id, revision)
+        # Reloads the positions of every task of the column in the session, not just the ones at hand
+        await session.exec(
+            select(Task)
+            .where((Task.column_id == column.id) | (Task.id == task.id))
+            .execution_options(populate_existing=True)
+        )
+
+        after_position = after.position if after is not None else None
+        before_position = before.position if before is not None else None
+        placement = await get_position_between(session, Task.position, siblings, after_position, before_position)
+        assert placement is not None
+
+    position, gap = placement
+    task.sqlmodel_update(
+        {"column_id": column.id, "position": position, "revision": revision, "version": task.version + 1}
+    )
     session.add(task)
-    session.commit()
-    session.refresh(task)
+    await session.flush()
+
+    invalidate_task(session, task.id)
+
+    return gap < CROWDED_GAP
+
+
+async def append_tasks(session: AsyncSession, column: "Column", tasks: list["Task"]) -> None:
+    """Moves the tasks to the end of the column in order, with one lock, one position query and one flush.
+
+    The tasks must have been loaded after locking the board with next_revision, their versions are bumped in place.
+    """
+    position = await get_next_task_position(session, column, len(tasks))
+    revision = await next_revision(session, column.board_id)
+
+    for task in tasks:
+        task.sqlmodel_update(
+            {"column_id": column.id, "position": position, "revision": revision, "version": task.version + 1}
+        )
+        position += POSITION_STEP
+
+        invalidate_task(session, task.id)
+
+    session.add_all(tasks)
+    await session.flush()
+
+
+async def rebalance_task_positions(column_id: int) -> None:
+    """Background job, runs in its own transaction."""
+    from .. import engine, Column, Task
+
+    async with AsyncSession(engine) as session:
+        board_id = (await session.exec(select(Column.board_id).where(Column.id == column_id))).first()
+        if board_id is None:
+            return
+
+        revision = await next_revision(session, board_id)
+        await lock_parent(session, Column, column_id)
+        await rebalance_positions(session, Task, Task.position, Task.column_id == column_id, revision)
+        await session.commit()
+
+
+async def update_task(
+    session: AsyncSession,
+    task: "Task",
+    update: dict[str, Any],
+    version: int | None = None
+) -> "Task":
+    """Raises VersionConflictError if `version` is given and the task was changed since."""
+    revision = await next_task_revision(session, task)
+    await update_versioned(session, task, dict(update, revision=revision), version)
+
+    if "column_id" in update:
+        invalidate_task(session, task.id)
 
     return task
 
 
-def delete_task(session: Session, task: "Task") -> None:
-    session.delete(task)
-    session.commit()
+async def update_tasks(session: AsyncSession, updates: list[tuple["Task", dict[str, Any]]]) -> None:
+    """Applies the updates and flushes them together, updates of the same fields go out as one executemany.
 
+    The tasks must have been loaded after locking their boards with next_revision, their versions are bumped in place.
+    """
+    for task, update in updates:
+        revision = await next_task_revision(session, task)
 
-def create_task_log(task: "Task", **kwargs) -> "TaskLog":
-    from .. import engine, TaskLog
+        task.sqlmodel_update(update)
+        task.revision = revision
+        task.version += 1
 
-    with Session(engine) as session:
-        new_task = TaskLog(task_id=task.id, **kwargs)
-        session.add(new_task)
-        session.commit()
-        session.refresh(new_task)
+        if "column_id" in update:
+            invalidate_task(session, task.id)
 
-        return new_task
+    session.add_all([task for task, _ in updates])
+    await session.flush()
 
 
-def get_task_logs(task: "Task") -> list["TaskLog"]:
-    from .. import engine, TaskLog
+async def delete_task(session: AsyncSession, task: "Task") -> None:
+    await delete_tasks(session, [task])
 
-    with Session(engine) as session:
-        return list(
-            session.exec(
-                select(TaskLog)
-                .where(TaskLog.task_id == task.id)
-            )
-        )
+
+async def delete_tasks(session: AsyncSession, tasks: list["Task"]) -> None:
+    """Deletes the tasks with a single DELETE."""
+    from .. import Column, Task
+
+    if not tasks:
+        return
+
+    task_ids_by_board: dict[int, list[int | None]] = {}
+    for task in tasks:
+        column = await session.get(Column, task.column_id)
+        assert column is not None
+        task_ids_by_board.setdefault(column.board_id, []).append(task.id)
+
+    revisions = {board_id: await next_revision(session, board_id) for board_id in task_ids_by_board}
+
+    await session.exec(delete(Task).where(col(Task.id).in_([task.id for task in tasks])))
+
+    for board_id, task_ids in task_ids_by_board.items():
+        await add_tombstones(session, board_id, "task", task_ids, revisions[board_id])
+
+    for task in tasks:
+        invalidate_task(session, task.id)
+
+
+async def create_task_logs(session: AsyncSession, entries: list[tuple["Task", str]]) -> list["TaskLog"]:
+    """Adds log entries, given as (task, content) pairs, flushed as a single multi-row INSERT."""
+    from .. import TaskLog
+
+    if not entries:
+        return []
+
+    task_logs = [TaskLog(task_id=task.id, content=content) for task, content in entries]
+    session.add_all(task_logs)
+    await session.flush()
+
+    return task_logs
+
+
+async def get_task_logs(
+    session: AsyncSession,
+    task: "Task",
+    pagination: Pagination
+) -> tuple[list["TaskLog"], str | None]:
+    from .. import TaskLog
+
+    return await paginate(
+        session,
+        select(TaskLog)
+        .where(TaskLog.task_id == task.id),
+        order_by=[col(TaskLog.created_at), col(TaskLog.id)],
+        key=lambda task_log: [task_log.created_at, task_log.id],
+        pagination=pagination,
+    )
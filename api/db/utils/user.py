@@ -1,43 +1,98 @@
+from os import getenv
 from typing import TYPE_CHECKING, Any, Union
 
-from sqlmodel import Session, select
+from sqlalchemy.orm import make_transient_to_detached
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import api.cache
 
 if TYPE_CHECKING:
     from .. import User
 
 
+# Column values of recently authenticated users, keyed by id. Per worker, the others keep accepting the tokens a change
+# of token_version revokes until their entries expire.
+user_cache: api.cache.TTLCache[int, dict[str, Any]] = api.cache.TTLCache(
+    maxsize=int(getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(getenv("USER_CACHE_TTL", "60")),
+)
+
+
+# "User" | None doesn't work even in python 3.13 ¯\_(ツ)_/¯
+async def get_user_by_id(session: AsyncSession, user_id: int | None) -> Union["User", None]:
+    from .. import User
+
+    if user_id is None:
+        return None
+
+    # session.get() answers from the identity map when the user is already loaded in this request
+    return await session.get(User, user_id)
+
+
+async def get_users_by_ids(session: AsyncSession, user_ids: set[int]) -> dict[int, "User"]:
+    from .. import User
+
+    if not user_ids:
+        return {}
+
+    users = (await session.exec(select(User).where(col(User.id).in_(user_ids)))).all()
+
+    return {user.id: user for user in users}
+
+
 # "User" | None doesn't work even in python 3.13 ¯\_(ツ)_/¯
-def get_user_by_id(user_id: int | None) -> Union["User", None]:
-    from .. import engine, User
+async def get_user_by_username(session: AsyncSession, username: str) -> Union["User", None]:
+    from .. import User
 
-    with Session(engine) as session:
-        return session.exec(select(User).where(User.id == user_id)).first()
+    return (await session.exec(select(User).where(User.username == username))).first()
 
 
 # "User" | None doesn't work even in python 3.13 ¯\_(ツ)_/¯
-def get_user_by_username(username: str) -> Union["User", None]:
-    from .. import engine, User
+async def get_cached_user(session: AsyncSession, user_id: int, token_version: int = 0) -> Union["User", None]:
+    """Like get_user_by_id, but served from user_cache when possible.
+
+    An entry older than `token_version` is treated as a miss, so a freshly issued token is never rejected
+    because the user was cached before their token version was bumped.
+    """
+    from .. import User
 
-    with Session(engine) as session:
-        return session.exec(select(User).where(User.username == username)).first()
+    cached = user_cache.get(user_id)
+    if cached is None or cached["token_version"] < token_version:
+        user = await get_user_by_id(session, user_id)
+        if user is not None:
+            user_cache.set(user_id, user.model_dump())
 
+        return user
 
-def register_user(**kwargs) -> "User":
-    from .. import engine, User
+    # Attach a private copy to the session without a query, so helpers like update_user keep working on it
+    user = User(**cached)
+    make_transient_to_detached(user)
 
-    with Session(engine) as session:
-        new_user = User(**kwargs)
-        session.add(new_user)
-        session.commit()
-        session.refresh(new_user)
+    return await session.merge(user, load=False)
 
-        return new_user
 
+async def register_user(session: AsyncSession, **kwargs) -> "User":
+    from .. import User
+
+    new_user = User(**kwargs)
+    session.add(new_user)
+    await session.flush()
+
+    return new_user
+
+
+async def update_user(session: AsyncSession, user: "User", update: dict[str, Any]) -> "User":
+    from .. import on_commit
 
-def update_user(session: Session, user: "User", update: dict[str, Any]) -> "User":
     user.sqlmodel_update(update)
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.flush()
+
+    if user.id is not None:
+        user_id = user.id
+        user_cache.pop(user_id)
+        # Again after commit, a concurrent request may have cached the old row in between
+        on_commit(session, lambda: user_cache.pop(user_id))
 
     return user
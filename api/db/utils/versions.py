@@ -0,0 +1,43 @@
+"""Row versions for optimistic concurrency control on Board, Column and Task.
+
+Every change to a row bumps its version. A client sends back the version it last saw with its change, which is then
+applied with a single compare-and-swap UPDATE, so it can't overwrite a change it hasn't seen and doesn't need to read
+the row again first. Rebalancing positions changes the position of every row it renumbers, so it bumps their versions
+too: writes with the version or If-Match of a column or task read before its siblings were rebalanced get 409.
+"""
+
+from typing import Any
+
+from sqlalchemy import update
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+class VersionConflictError(Exception):
+    pass
+
+
+async def update_versioned(session: AsyncSession, row: SQLModel, values: dict[str, Any], version: int | None) -> None:
+    """Applies `values` to the row and bumps its version in one statement, if the row is still at `version`.
+
+    Any version matches None. The instance is updated from the row. Raises VersionConflictError, changing nothing,
+    if the row was changed since.
+    """
+    model = type(row)
+
+    # Loaded before the caller's locks, an outdated version here is a conflict for sure
+    if version is not None and row.version != version:
+        raise VersionConflictError(f"{model.__name__} was changed since version {version}")
+
+    statement = update(model).where(model.id == row.id)
+    if version is not None:
+        statement = statement.where(model.version == version)
+
+    updated = (await session.exec(
+        statement
+        .values(**values, version=model.version + 1)
+        .returning(model)
+        .execution_options(populate_existing=True)
+    )).first()
+    if updated is None:
+        raise VersionConflictError(f"{model.__name__} was changed since version {version}")
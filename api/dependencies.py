@@ -1,28 +1,46 @@
 from typing import Annotated
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Query, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
 import jwt
-from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 import api.db
 
 # --- Session ---
 
 
-def get_session():
-    with Session(api.db.engine) as session:
+async def get_session():
+    # One session (and one transaction) per request: helpers only flush, the commit happens here,
+    # before the response is sent, so a failed commit is reported to the client.
+    async with AsyncSession(api.db.engine) as session:
         yield session
+        await api.db.commit(session)
 
 
-SessionDep = Annotated[Session, Depends(get_session)]
+SessionDep = Annotated[AsyncSession, Depends(get_session, scope="function")]
+
+# --- Pagination ---
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+async def get_pagination(
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    after: str | None = None,
+) -> api.db.Pagination:
+    return api.db.Pagination(limit=limit, after=after)
+
+
+PaginationDep = Annotated[api.db.Pagination, Depends(get_pagination)]
 
 # --- User Validation ---
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> api.db.User:
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], session: SessionDep) -> api.db.User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -31,17 +49,20 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> api
 
     try:
         payload = jwt.decode(token, api.utils.read_secret("SECRET_KEY"), algorithms=[api.utils.HASH_ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
+        user_id = payload.get("uid")
+        token_version = payload.get("ver")
+        if user_id is None or token_version is None:
             raise credentials_exception
     except jwt.InvalidTokenError:
         raise credentials_exception
 
-    user = api.db.get_user_by_username(username)
+    user = await api.db.get_cached_user(session, user_id, token_version)
     if user is None:
         raise credentials_exception
     if user.id is None:
         raise credentials_exception
+    if user.token_version != token_version:
+        raise credentials_exception
 
     return user
 
@@ -51,8 +72,8 @@ CurrentUserDep = Annotated[api.db.User, Depends(get_current_user)]
 # -- Board ---
 
 
-def owner_get_board(board_id: int, current_user: CurrentUserDep, session: SessionDep) -> api.db.Board:
-    board = session.get(api.db.Board, board_id)
+async def owner_get_board(board_id: int, current_user: CurrentUserDep, session: SessionDep) -> api.db.Board:
+    board = await session.get(api.db.Board, board_id)
     if board is None:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Board not found")
     if board.owner_id != current_user.id:
@@ -61,26 +82,20 @@ def owner_get_board(board_id: int, current_user: CurrentUserDep, session: Sessio
     return board
 
 
-def check_user_access(user: api.db.User, board: api.db.Board) -> bool:
+async def check_user_access(session: AsyncSession, user: api.db.User, board: api.db.Board) -> bool:
     if board.owner_id == user.id:
         return True
 
-    with Session(api.db.engine) as session:
-        board_user_access = session.exec(
-            select(api.db.BoardUserAccess).where(
-                api.db.BoardUserAccess.board_id == board.id,
-                api.db.BoardUserAccess.user_id == user.id
-            )
-        ).first()
+    board_access = await api.db.get_board_access(session, board.id)
 
-        return board_user_access is not None
+    return board_access is not None and board_access.allows(user.id)
 
 
-def user_get_board(board_id: int, current_user: CurrentUserDep, session: SessionDep) -> api.db.Board:
-    board = session.get(api.db.Board, board_id)
+async def user_get_board(board_id: int, current_user: CurrentUserDep, session: SessionDep) -> api.db.Board:
+    board = await session.get(api.db.Board, board_id)
     if board is None:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Board not found")
-    if not check_user_access(current_user, board):
+    if not await check_user_access(session, current_user, board):
         raise HTTPException(status.HTTP_403_FORBIDDEN, "Not enough permissions")
 
     return board
@@ -92,16 +107,39 @@ BoardCollaboratorAccessDep = Annotated[api.db.Board, Depends(user_get_board)]
 # --- Column ---
 
 
-def get_board_and_column(
+async def check_cached_access(session: AsyncSession, user: api.db.User, board_id: int | None) -> bool:
+    """Checks access before loading anything when the board of a column or task is already known.
+
+    Returns whether the check happened. A missing board is left to the load, which reports it as not found. The check
+    only counts if the load then finds the same board, a stale mapping must not grant access to another one.
+    """
+    if board_id is None:
+        return False
+
+    board_access = await api.db.get_board_access(session, board_id)
+    if board_access is None:
+        return False
+    if not board_access.allows(user.id):
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Not enough permissions")
+
+    return True
+
+
+async def get_board_and_column(
     current_user: CurrentUserDep,
     column_id: int,
     session: SessionDep
 ) -> tuple[api.db.Board, api.db.Column]:
-    column = session.get(api.db.Column, column_id)
-    if column is None:
+    cached_board_id = api.db.get_cached_column_board_id(column_id)
+    checked = await check_cached_access(session, current_user, cached_board_id)
+
+    row = await api.db.get_column_and_board(session, column_id)
+    if row is None:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Column not found")
 
-    board = user_get_board(column.board_id, current_user, session)
+    column, board = row
+    if not (checked and board.id == cached_board_id) and not await check_user_access(session, current_user, board):
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Not enough permissions")
 
     return board, column
 
@@ -112,18 +150,118 @@ BoardColumnDep = Annotated[tuple[api.db.Board, api.db.Column], Depends(get_board
 # --- Task ---
 
 
-def get_board_column_and_task(
+async def get_board_column_and_task(
     current_user: CurrentUserDep,
     task_id: int,
     session: SessionDep
 ) -> tuple[api.db.Board, api.db.Column, api.db.Task]:
-    task = session.get(api.db.Task, task_id)
-    if task is None:
+    cached_board_id = api.db.get_cached_task_board_id(task_id)
+    checked = await check_cached_access(session, current_user, cached_board_id)
+
+    row = await api.db.get_task_column_and_board(session, task_id)
+    if row is None:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Task not found")
 
-    board, column = get_board_and_column(current_user, task.column_id, session)
+    task, column, board = row
+    if not (checked and board.id == cached_board_id) and not await check_user_access(session, current_user, board):
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Not enough permissions")
 
     return board, column, task
 
 
 BoardColumnTaskDep = Annotated[tuple[api.db.Board, api.db.Column, api.db.Task], Depends(get_board_column_and_task)]
+
+# --- Conditional requests ---
+
+
+def get_board_etag(board: api.db.Board) -> str:
+    # Weak: every change to the board bumps its revision, and clients key their caches on the URL,
+    # which tells the representations of the board apart
+    return f'W/"{board.id}-{board.revision}"'
+
+
+def get_version_etag(row: api.db.Board | api.db.Column | api.db.Task) -> str:
+    # Strong: every change to the row bumps its version, and single item responses show nothing but the row. Clients
+    # send it back as If-Match with their changes.
+    return f'"{row.version}"'
+
+
+def set_version_etag(response: Response, row: api.db.Board | api.db.Column | api.db.Task) -> None:
+    response.headers["ETag"] = get_version_etag(row)
+
+
+def check_not_modified(request: Request, response: Response, etag: str) -> None:
+    """Answers 304 Not Modified if the client already has the representation tagged `etag`, or sets the ETag."""
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        # Weak comparison, W/ prefixes don't count
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in tags or etag.removeprefix("W/") in tags:
+            raise HTTPException(status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    # Responses depend on the user's access, only their own cache may keep them, and must revalidate
+    response.headers["Cache-Control"] = "private, no-cache"
+
+
+# Board-wide reads, tagged with the board revision
+
+
+async def board_not_modified(request: Request, response: Response, board: BoardCollaboratorAccessDep) -> None:
+    check_not_modified(request, response, get_board_etag(board))
+
+
+async def column_not_modified(request: Request, response: Response, board_and_column: BoardColumnDep) -> None:
+    board, _ = board_and_column
+    check_not_modified(request, response, get_board_etag(board))
+
+
+async def task_not_modified(request: Request, response: Response, board_column_and_task: BoardColumnTaskDep) -> None:
+    board, _, _ = board_column_and_task
+    check_not_modified(request, response, get_board_etag(board))
+
+
+# Single item reads, tagged with the row version
+
+
+async def board_version_not_modified(request: Request, response: Response, board: BoardCollaboratorAccessDep) -> None:
+    check_not_modified(request, response, get_version_etag(board))
+
+
+async def column_version_not_modified(request: Request, response: Response, board_and_column: BoardColumnDep) -> None:
+    _, column = board_and_column
+    check_not_modified(request, response, get_version_etag(column))
+
+
+async def task_version_not_modified(
+    request: Request,
+    response: Response,
+    board_column_and_task: BoardColumnTaskDep,
+) -> None:
+    _, _, task = board_column_and_task
+    check_not_modified(request, response, get_version_etag(task))
+
+
+# --- Optimistic concurrency ---
+
+# The row version a change was made against, as the ETag of the single item responses of the row: If-Match: "3"
+IfMatchDep = Annotated[str | None, Header()]
+
+
+def get_expected_version(if_match: str | None, version: int | None) -> int | None:
+    """The version from If-Match or from the `version` field of the change, None if the client sent neither."""
+    if if_match is None or if_match.strip() == "*":
+        return version
+
+    tag = if_match.strip()
+    # If-Match uses strong comparison, a weak tag (like the W/ ones of board-wide reads) never matches
+    if not (tag.startswith('"') and tag.endswith('"') and tag[1:-1].isdigit()):
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST, 'If-Match must be the ETag of the board, column or task, like "3"'
+        )
+
+    expected_version = int(tag[1:-1])
+    if version is not None and version != expected_version:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "If-Match and version don't match")
+
+    return expected_version
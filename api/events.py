@@ -0,0 +1,190 @@
+"""Pushes board changes to the clients watching the board.
+
+Routers publish events inside the request's transaction, they are only delivered once it commits. Each worker keeps a
+hub of the subscriptions of its own clients, and a broker carries the events to the hubs: the local one only delivers
+within the worker, the Postgres one goes through LISTEN/NOTIFY so every worker connected to the database gets them.
+
+Events only say what changed and the board revision it got, clients fetch the data from /boards/{id}/changes.
+"""
+
+import asyncio
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+import json
+import logging
+from os import getenv
+from typing import Iterator
+
+import asyncpg
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import api.db
+
+logger = logging.getLogger(__name__)
+
+# "local" for a single worker, "postgres" to fan out across workers
+EVENTS_BROKER = getenv("EVENTS_BROKER", "local")
+# Subscribers that fall this many events behind are dropped, they reconnect and catch up from /changes
+EVENTS_QUEUE_SIZE = int(getenv("EVENTS_QUEUE_SIZE", "100"))
+EVENTS_CHANNEL = "board_events"
+# LISTEN needs a session of its own, behind PgBouncer in transaction mode point these at PostgreSQL directly
+EVENTS_POSTGRES_HOST = getenv("EVENTS_POSTGRES_HOST")
+EVENTS_POSTGRES_PORT = getenv("EVENTS_POSTGRES_PORT")
+RECONNECT_DELAY = 1
+
+
+@dataclass
+class BoardEvent:
+    # e.g. "task.updated"
+    type: str
+    board_id: int
+    # The board revision after the change, None if the board is gone or the request changed nothing
+    revision: int | None
+    # Id of the column, task or member, if the event is about one
+    id: int | None = None
+
+
+class Subscription:
+    def __init__(self, board_id: int) -> None:
+        self.board_id = board_id
+        # None tells the subscriber it was dropped
+        self.queue: asyncio.Queue[BoardEvent | None] = asyncio.Queue(EVENTS_QUEUE_SIZE)
+
+    def put(self, event: BoardEvent) -> bool:
+        """Queues the event without waiting, returns False if the subscriber is too far behind and got dropped."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.drop()
+            return False
+
+        return True
+
+    def drop(self) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+        self.queue.put_nowait(None)
+
+    async def get(self) -> BoardEvent | None:
+        """The next event, None once the subscription is dropped."""
+        return await self.queue.get()
+
+
+class Hub:
+    def __init__(self) -> None:
+        self.subscriptions: dict[int, set[Subscription]] = {}
+
+    @contextmanager
+    def subscribe(self, board_id: int) -> Iterator[Subscription]:
+        subscription = Subscription(board_id)
+        self.subscriptions.setdefault(board_id, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            self._remove(subscription)
+
+    def dispatch(self, event: BoardEvent) -> None:
+        for subscription in list(self.subscriptions.get(event.board_id, ())):
+            if not subscription.put(event):
+                self._remove(subscription)
+
+    def drop_all(self) -> None:
+        """Drops every subscription, for when events may have been missed."""
+        for subscriptions in list(self.subscriptions.values()):
+            for subscription in list(subscriptions):
+                subscription.drop()
+                self._remove(subscription)
+
+    def _remove(self, subscription: Subscription) -> None:
+        subscriptions = self.subscriptions.get(subscription.board_id)
+        if subscriptions is None:
+            return
+
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self.subscriptions[subscription.board_id]
+
+
+hub = Hub()
+
+
+class LocalBroker:
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, session: AsyncSession, event: BoardEvent) -> None:
+        api.db.on_commit(session, lambda: hub.dispatch(event))
+
+
+class PostgresBroker:
+    """Needs a direct connection to PostgreSQL for LISTEN, not one through a transaction pooler.
+
+    See EVENTS_POSTGRES_HOST.
+    """
+
+    def __init__(self) -> None:
+        self.connection: asyncpg.Connection | None = None
+        self.reconnecting: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        url = api.db.engine.url
+        if url.get_backend_name() != "postgresql":
+            raise RuntimeError("EVENTS_BROKER=postgres needs a PostgreSQL database")
+
+        self.connection = await asyncpg.connect(
+            host=EVENTS_POSTGRES_HOST or url.host,
+            port=int(EVENTS_POSTGRES_PORT) if EVENTS_POSTGRES_PORT else url.port,
+            user=url.username,
+            password=url.password,
+            database=url.database,
+        )
+        self.connection.add_termination_listener(self._on_termination)
+        await self.connection.add_listener(EVENTS_CHANNEL, self._on_notification)
+
+    async def stop(self) -> None:
+        if self.reconnecting is not None:
+            self.reconnecting.cancel()
+
+        if self.connection is not None:
+            self.connection.remove_termination_listener(self._on_termination)
+            await self.connection.close()
+            self.connection = None
+
+    async def publish(self, session: AsyncSession, event: BoardEvent) -> None:
+        # NOTIFY is transactional, it is only sent if the transaction commits
+        await session.exec(select(func.pg_notify(EVENTS_CHANNEL, json.dumps(asdict(event)))))
+
+    def _on_notification(self, _connection: asyncpg.Connection, _pid: int, _channel: str, payload: str) -> None:
+        hub.dispatch(BoardEvent(**json.loads(payload)))
+
+    def _on_termination(self, _connection: asyncpg.Connection) -> None:
+        self.connection = None
+        self.reconnecting = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        while True:
+            try:
+                await self.start()
+            except (OSError, asyncpg.PostgresError):
+                logger.exception("Couldn't reconnect to listen for board events")
+                await asyncio.sleep(RECONNECT_DELAY)
+            else:
+                break
+
+        # Whatever was sent while disconnected is lost, make the clients catch up
+        hub.drop_all()
+
+
+broker = PostgresBroker() if EVENTS_BROKER == "postgres" else LocalBroker()
+
+
+async def publish(session: AsyncSession, board_id: int, type: str, id: int | None = None) -> None:
+    """Publishes an event about a change made in the session's transaction, delivered once it commits."""
+    event = BoardEvent(type=type, board_id=board_id, revision=api.db.get_pending_revision(session, board_id), id=id)
+    await broker.publish(session, event)
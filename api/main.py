@@ -1,16 +1,94 @@
-import dotenv
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from os import getenv
+from time import perf_counter
+
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError, TimeoutError as PoolTimeoutError
 
 import api.db
+import api.events
+import api.metrics
 import api.routers
 
-dotenv.load_dotenv()
 
-api.db.create_db_and_tables()
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    # Migrations run before the deployment, see api.db.schema
+    await api.db.prepare_schema()
+    await api.events.broker.start()
+    yield
+    await api.events.broker.stop()
+    await api.db.engine.dispose()
+    api.metrics.mark_process_dead()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.include_router(api.routers.auth_router)
 app.include_router(api.routers.users_router)
 app.include_router(api.routers.boards_router)
 app.include_router(api.routers.columns_router)
 app.include_router(api.routers.tasks_router)
+app.include_router(api.routers.metrics_router)
+
+api.metrics.install_pool_metrics(api.db.engine)
+
+
+@app.exception_handler(IntegrityError)
+async def integrity_error_handler(_: Request, __: IntegrityError) -> JSONResponse:
+    # Unique constraints catch what validation can't, e.g. two requests taking the same position at once
+    return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"detail": "Conflicting change"})
+
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(_: Request, __: PoolTimeoutError) -> JSONResponse:
+    # No database connection freed up within DB_POOL_TIMEOUT, the API is overloaded
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Service overloaded, try again later"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(api.db.VersionConflictError)
+async def version_conflict_handler(_: Request, exc: api.db.VersionConflictError) -> JSONResponse:
+    # Clients fetch the row again and redo their change on top of it
+    return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"detail": str(exc)})
+
+
+@app.exception_handler(api.db.InvalidCursorError)
+async def invalid_cursor_handler(_: Request, exc: api.db.InvalidCursorError) -> JSONResponse:
+    return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": str(exc)})
+
+
+QUERY_COUNT_HEADERS = getenv("QUERY_COUNT_HEADERS") == "True"
+
+
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    query_counter = api.db.start_query_counter(request.scope)
+    api.metrics.requests_in_progress.inc()
+    start = perf_counter()
+
+    def observe(status_code: int) -> None:
+        pool_wait = query_counter.pool_wait if query_counter.checkouts else None
+        api.metrics.observe_request(request.scope, status_code, perf_counter() - start, pool_wait)
+
+    try:
+        # Returns once the headers are ready, streamed bodies like the event streams aren't timed
+        response = await call_next(request)
+    except Exception:
+        observe(status.HTTP_500_INTERNAL_SERVER_ERROR)
+        raise
+    finally:
+        api.metrics.requests_in_progress.dec()
+    observe(response.status_code)
+
+    if QUERY_COUNT_HEADERS:
+        response.headers["X-Query-Count"] = str(query_counter.queries)
+        response.headers["X-Connection-Checkouts"] = str(query_counter.checkouts)
+    if api.db.SQL_STATS:
+        response.headers["Server-Timing"] = api.db.get_server_timing(query_counter)
+    api.db.report_queries(query_counter, response.status_code)
+
+    return response
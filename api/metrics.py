@@ -0,0 +1,97 @@
+"""Prometheus metrics of the requests, the connection pool and the authentication, served at /metrics.
+
+Each worker process updates its own metrics. With several workers, set PROMETHEUS_MULTIPROC_DIR to an empty directory
+before they start, like api.serve does: every worker then writes its values to memory-mapped files there, without
+locks, and a scrape of any worker aggregates the files of all of them.
+"""
+
+import os
+from os import getenv
+from typing import Any
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, multiprocess
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+PROMETHEUS_MULTIPROC_DIR = getenv("PROMETHEUS_MULTIPROC_DIR")
+
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time to the response headers, by route template",
+    ["method", "route", "status"],
+)
+requests_in_progress = Gauge(
+    "http_requests_in_progress",
+    "Requests being handled",
+    multiprocess_mode="livesum",
+)
+
+pool_size = Gauge("db_pool_size", "Connections the pools keep open", multiprocess_mode="livesum")
+pool_checked_out = Gauge("db_pool_checked_out", "Connections in use", multiprocess_mode="livesum")
+pool_overflow = Gauge("db_pool_overflow", "Connections open beyond the pool size", multiprocess_mode="livesum")
+pool_wait = Histogram(
+    "db_pool_wait_seconds",
+    "Time a request spent getting connections from the pool",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30),
+)
+
+password_hash_duration = Histogram(
+    "auth_password_hash_seconds",
+    "Time to hash or check a password, without the wait for a hashing thread",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+failed_logins = Counter("auth_failed_logins", "Logins refused for a wrong username or password")
+
+
+def get_registry() -> CollectorRegistry:
+    if PROMETHEUS_MULTIPROC_DIR is None:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+
+    return registry
+
+
+def observe_request(
+    scope: dict[str, Any],
+    status_code: int,
+    duration: float,
+    pool_wait_duration: float | None,
+) -> None:
+    """Records a finished request, `pool_wait_duration` is None if it didn't use the database."""
+    route = scope.get("route")
+    # Unmatched paths are unbounded, e.g. scanners probing for files
+    route_template = route.path if route is not None else "unmatched"
+
+    request_duration.labels(scope["method"], route_template, str(status_code)).observe(duration)
+    if pool_wait_duration is not None:
+        pool_wait.observe(pool_wait_duration)
+
+
+def install_pool_metrics(engine: AsyncEngine) -> None:
+    pool_size.set(engine.sync_engine.pool.size())
+
+    # Listeners carry over to the pool that replaces this one on engine.dispose()
+    @event.listens_for(engine.sync_engine.pool, "checkout")
+    def update_on_checkout(*_):
+        pool = engine.sync_engine.pool
+        pool_checked_out.set(pool.checkedout())
+        # Negative while fewer than pool_size connections are open
+        pool_overflow.set(max(pool.overflow(), 0))
+
+    @event.listens_for(engine.sync_engine.pool, "checkin")
+    def update_on_checkin(*_):
+        # The connection isn't back in the pool yet
+        pool = engine.sync_engine.pool
+        pool_checked_out.set(pool.checkedout() - 1)
+        # It is closed rather than kept if the pool already keeps pool_size idle ones
+        overflow = pool.overflow() - 1 if pool.checkedin() >= pool.size() else pool.overflow()
+        pool_overflow.set(max(overflow, 0))
+
+
+def mark_process_dead() -> None:
+    """Drops the gauges of this worker from the aggregates, when it stops."""
+    if PROMETHEUS_MULTIPROC_DIR is not None:
+        multiprocess.mark_process_dead(os.getpid())
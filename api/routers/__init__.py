@@ -1,5 +1,6 @@
 from .auth import router as auth_router
 from .boards import router as boards_router
 from .columns import router as columns_router
+from .metrics import router as metrics_router
 from .tasks import router as tasks_router
 from .users import router as users_router
@@ -4,29 +4,29 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 import jwt
-import bcrypt
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 import api.db
+import api.dependencies
+import api.metrics
 import api.schemas
 import api.utils
-import api.schemas
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 router = APIRouter(tags=["auth"])
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
-
-
-def authenticate_user(username: str, password: str) -> api.db.User | None:
-    user = api.db.get_user_by_username(username)
+async def authenticate_user(session: AsyncSession, username: str, password: str) -> api.db.User | None:
+    user = await api.db.get_user_by_username(session, username)
     if user is None:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await api.utils.verify_password(password, user.hashed_password):
         return None
 
+    if api.utils.password_needs_rehash(user.hashed_password):
+        await api.db.update_user(session, user, {"hashed_password": await api.utils.get_password_hash(password)})
+
     return user
 
 
@@ -42,9 +42,13 @@ def create_access_token(data: dict, expires_delta: timedelta) -> api.schemas.Tok
 
 
 @router.post("/token")
-async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> api.schemas.Token:
-    user = authenticate_user(form_data.username, form_data.password)
+async def login_for_access_token(
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+    session: api.dependencies.SessionDep,
+) -> api.schemas.Token:
+    user = await authenticate_user(session, form_data.username, form_data.password)
     if user is None:
+        api.metrics.failed_logins.inc()
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -52,23 +56,24 @@ async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm,
         )
 
     return create_access_token(
-        data={"sub": user.username},
+        data={"sub": user.username, "uid": user.id, "ver": user.token_version},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
 
 
 @router.post("/register", status_code=status.HTTP_201_CREATED)
-async def register(user_create: api.schemas.UserCreate) -> api.schemas.Token:
-    if api.db.get_user_by_username(user_create.username) is not None:
+async def register(user_create: api.schemas.UserCreate, session: api.dependencies.SessionDep) -> api.schemas.Token:
+    if await api.db.get_user_by_username(session, user_create.username) is not None:
         raise HTTPException(status.HTTP_409_CONFLICT, "Username already taken")
 
-    new_user = api.db.register_user(
+    new_user = await api.db.register_user(
+        session,
         username=user_create.username,
-        hashed_password=api.utils.get_password_hash(user_create.password),
+        hashed_password=await api.utils.get_password_hash(user_create.password),
         name=user_create.name,
     )
 
     return create_access_token(
-        data={"sub": new_user.username},
+        data={"sub": new_user.username, "uid": new_user.id, "ver": new_user.token_version},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
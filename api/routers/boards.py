@@ -1,20 +1,36 @@
-from fastapi import APIRouter, HTTPException, status
+from dataclasses import asdict
+from typing import Annotated, AsyncIterable
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.sse import EventSourceResponse, ServerSentEvent
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 import api.db
 import api.dependencies
+import api.events
 import api.schemas
 
 router = APIRouter(tags=["boards"])
 
 
-@router.get("/boards/", response_model=list[api.schemas.BoardPublic])
-async def get_owned_boards(current_user: api.dependencies.CurrentUserDep):
-    return api.db.get_owned_boards(current_user.id)
+@router.get("/boards/", response_model=api.schemas.Page[api.schemas.BoardPublic])
+async def get_owned_boards(
+    current_user: api.dependencies.CurrentUserDep,
+    session: api.dependencies.SessionDep,
+    pagination: api.dependencies.PaginationDep
+):
+    items, next_cursor = await api.db.get_owned_boards(session, current_user.id, pagination)
+    return {"items": items, "next_cursor": next_cursor}
 
 
-@router.get("/boards/shared/", response_model=list[api.schemas.BoardPublic])
-async def get_shared_boards(current_user: api.dependencies.CurrentUserDep):
-    return api.db.get_shared_boards(current_user.id)
+@router.get("/boards/shared/", response_model=api.schemas.Page[api.schemas.BoardPublic])
+async def get_shared_boards(
+    current_user: api.dependencies.CurrentUserDep,
+    session: api.dependencies.SessionDep,
+    pagination: api.dependencies.PaginationDep
+):
+    items, next_cursor = await api.db.get_shared_boards(session, current_user.id, pagination)
+    return {"items": items, "next_cursor": next_cursor}
 
 
 @router.post(
@@ -24,33 +40,134 @@ async def get_shared_boards(current_user: api.dependencies.CurrentUserDep):
 )
 async def create_board(
     current_user: api.dependencies.CurrentUserDep,
-    board_create: api.schemas.BoardCreate
+    board_create: api.schemas.BoardCreate,
+    session: api.dependencies.SessionDep,
+    response: Response,
 ):
-    return api.db.create_board(current_user, **board_create.model_dump())
+    board = await api.db.create_board(session, current_user, **board_create.model_dump())
+    api.dependencies.set_version_etag(response, board)
+
+    return board
 
 
-@router.get("/boards/{board_id}", response_model=api.schemas.BoardPublic)
+@router.get(
+    "/boards/{board_id}",
+    response_model=api.schemas.BoardPublic,
+    dependencies=[Depends(api.dependencies.board_version_not_modified)],
+)
 async def get_board(board: api.dependencies.BoardCollaboratorAccessDep):
     return board
 
 
+@router.get(
+    "/boards/{board_id}/full",
+    response_model=api.schemas.BoardFullPublic,
+    dependencies=[Depends(api.dependencies.board_not_modified)],
+)
+async def get_full_board(board: api.dependencies.BoardCollaboratorAccessDep, session: api.dependencies.SessionDep):
+    board = await api.db.get_full_board(session, board)
+
+    return api.schemas.BoardFullPublic.model_validate(
+        {
+            "id": board.id,
+            "name": board.name,
+            "owner_id": board.owner_id,
+            "version": board.version,
+            "revision": board.revision,
+            "columns": board.columns,
+            "users": [board.owner, *board.members],
+        },
+        from_attributes=True,
+    )
+
+
+@router.get("/boards/{board_id}/changes", response_model=api.schemas.BoardChangesPublic)
+async def get_changes(
+    board: api.dependencies.BoardCollaboratorAccessDep,
+    session: api.dependencies.SessionDep,
+    since: Annotated[int, Query(ge=0)] = 0,
+):
+    revision, columns, tasks, users, tombstones = await api.db.get_changes(session, board, since)
+    # Members removed and added back since are only listed as members
+    removed_user_ids = {tombstone.item_id for tombstone in tombstones if tombstone.kind == "member"}
+    removed_user_ids -= {user.id for user in users}
+
+    return {
+        "revision": revision,
+        "board": board,
+        "columns": columns,
+        "tasks": tasks,
+        "users": users,
+        "deleted_column_ids": [tombstone.item_id for tombstone in tombstones if tombstone.kind == "column"],
+        "deleted_task_ids": [tombstone.item_id for tombstone in tombstones if tombstone.kind == "task"],
+        "removed_user_ids": sorted(removed_user_ids),
+    }
+
+
+@router.get("/boards/{board_id}/events", response_class=EventSourceResponse)
+async def get_events(
+    board: api.dependencies.BoardCollaboratorAccessDep,
+    current_user: api.dependencies.CurrentUserDep,
+) -> AsyncIterable[ServerSentEvent]:
+    """Server-sent events about the board's changes, starting with "ready" and the current revision.
+
+    The stream ends when the board is deleted, when the user is removed from it or when the client falls too far
+    behind. Clients then reconnect and catch up from /boards/{board_id}/changes.
+    """
+    # The request's session is already closed by now, its instances are detached and can't reload expired attributes.
+    # The stream can stay open for hours without holding a database connection.
+    board_id, user_id = board.id, current_user.id
+
+    with api.events.hub.subscribe(board_id) as subscription:
+        # Read after subscribing, so no change committed after this revision is missed
+        async with AsyncSession(api.db.engine) as session:
+            revision = await api.db.get_revision(session, board_id)
+
+        yield ServerSentEvent(event="ready", data={"revision": revision}, id=str(revision))
+
+        while (event := await subscription.get()) is not None:
+            yield ServerSentEvent(
+                event=event.type,
+                data=asdict(event),
+                id=str(event.revision) if event.revision is not None else None,
+            )
+
+            if event.type == "board.deleted" or (event.type == "member.removed" and event.id == user_id):
+                return
+
+
 @router.patch("/boards/{board_id}", response_model=api.schemas.BoardPublic)
 async def update_board(
     board: api.dependencies.BoardOwnerAccessDep,
     board_update: api.schemas.BoardUpdate,
-    session: api.dependencies.SessionDep
+    session: api.dependencies.SessionDep,
+    response: Response,
+    if_match: api.dependencies.IfMatchDep = None,
 ):
-    return api.db.update_board(session, board, board_update.model_dump(exclude_unset=True))
+    version = api.dependencies.get_expected_version(if_match, board_update.version)
+    board = await api.db.update_board(
+        session, board, board_update.model_dump(exclude_unset=True, exclude={"version"}), version
+    )
+    await api.events.publish(session, board.id, "board.updated")
+    api.dependencies.set_version_etag(response, board)
+
+    return board
 
 
 @router.delete("/boards/{board_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_board(board: api.dependencies.BoardOwnerAccessDep, session: api.dependencies.SessionDep) -> None:
-    api.db.delete_board(session, board)
+    await api.db.delete_board(session, board)
+    await api.events.publish(session, board.id, "board.deleted")
 
 
-@router.get("/boards/{board_id}/users/", response_model=list[api.schemas.UserPublic])
-async def get_users(board: api.dependencies.BoardCollaboratorAccessDep):
-    return api.db.get_users(board)
+@router.get("/boards/{board_id}/users/", response_model=api.schemas.Page[api.schemas.UserPublic])
+async def get_users(
+    board: api.dependencies.BoardCollaboratorAccessDep,
+    session: api.dependencies.SessionDep,
+    pagination: api.dependencies.PaginationDep
+):
+    items, next_cursor = await api.db.get_users(session, board, pagination)
+    return {"items": items, "next_cursor": next_cursor}
 
 
 @router.post(
@@ -58,22 +175,30 @@ async def get_users(board: api.dependencies.BoardCollaboratorAccessDep):
     status_code=status.HTTP_201_CREATED,
     response_model=api.schemas.BoardUserAccessPublic
 )
-async def add_user(board: api.dependencies.BoardOwnerAccessDep, user_id: int):
+async def add_user(board: api.dependencies.BoardOwnerAccessDep, user_id: int, session: api.dependencies.SessionDep):
     if board.owner_id == user_id:
         raise HTTPException(status.HTTP_409_CONFLICT, "User is the owner of this board")
 
-    if api.db.get_user_by_id(user_id) is None:
+    if await api.db.get_user_by_id(session, user_id) is None:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "User not found")
 
-    return api.db.add_user(board, user_id)
+    board_user_access = await api.db.add_user(session, board, user_id)
+    await api.events.publish(session, board.id, "member.added", user_id)
+
+    return board_user_access
 
 
 @router.delete("/boards/{board_id}/users/", status_code=status.HTTP_204_NO_CONTENT)
-async def remove_user(board: api.dependencies.BoardOwnerAccessDep, user_id: int) -> None:
+async def remove_user(
+    board: api.dependencies.BoardOwnerAccessDep,
+    user_id: int,
+    session: api.dependencies.SessionDep
+) -> None:
     if board.owner_id == user_id:
         raise HTTPException(status.HTTP_409_CONFLICT, "Can't remove owner from the board")
 
-    if api.db.get_user_by_id(user_id) is None:
+    if await api.db.get_user_by_id(session, user_id) is None:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "User not found")
 
-    api.db.remove_user(board, user_id)
+    await api.db.remove_user(session, board, user_id)
+    await api.events.publish(session, board.id, "member.removed", user_id)
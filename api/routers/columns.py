@@ -1,24 +1,57 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 import api.db
 import api.dependencies
+import api.events
 import api.schemas
 
 router = APIRouter(tags=["columns"])
 
 
-def validate_position(board: api.db.Board, new_position: int):
+async def validate_position(session: AsyncSession, board: api.db.Board, new_position: int):
     if new_position < 0:
         raise HTTPException(status.HTTP_409_CONFLICT, "Position must be greater or equal 0")
+    if new_position > api.db.MAX_POSITION:
+        raise HTTPException(status.HTTP_409_CONFLICT, f"Position must be less or equal {api.db.MAX_POSITION}")
 
-    for column in api.db.get_columns(board):
-        if column.position == new_position:
-            raise HTTPException(status.HTTP_409_CONFLICT, "This position is already taken")
+    if await api.db.get_column_by_position(session, board, new_position) is not None:
+        raise HTTPException(status.HTTP_409_CONFLICT, "This position is already taken")
 
 
-@router.get("/boards/{board_id}/columns/", response_model=list[api.schemas.ColumnPublic])
-async def get_columns(board: api.dependencies.BoardCollaboratorAccessDep):
-    return api.db.get_columns(board)
+async def validate_sibling(
+    session: AsyncSession,
+    column: api.db.Column,
+    sibling_id: int | None
+) -> api.db.Column | None:
+    if sibling_id is None:
+        return None
+
+    sibling = await api.db.get_column_by_id(session, sibling_id)
+    if sibling is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Column not found")
+
+    if sibling.board_id != column.board_id:
+        raise HTTPException(status.HTTP_409_CONFLICT, "Cannot move columns between boards")
+
+    if sibling.id == column.id:
+        raise HTTPException(status.HTTP_409_CONFLICT, "Cannot place a column next to itself")
+
+    return sibling
+
+
+@router.get(
+    "/boards/{board_id}/columns/",
+    response_model=api.schemas.Page[api.schemas.ColumnPublic],
+    dependencies=[Depends(api.dependencies.board_not_modified)],
+)
+async def get_columns(
+    board: api.dependencies.BoardCollaboratorAccessDep,
+    session: api.dependencies.SessionDep,
+    pagination: api.dependencies.PaginationDep
+):
+    items, next_cursor = await api.db.get_columns(session, board, pagination)
+    return {"items": items, "next_cursor": next_cursor}
 
 
 @router.post(
@@ -26,11 +59,24 @@ async def get_columns(board: api.dependencies.BoardCollaboratorAccessDep):
     status_code=status.HTTP_201_CREATED,
     response_model=api.schemas.ColumnPublic
 )
-async def create_column(board: api.dependencies.BoardCollaboratorAccessDep, column_create: api.schemas.ColumnCreate):
-    return api.db.create_column(board, **column_create.model_dump())
+async def create_column(
+    board: api.dependencies.BoardCollaboratorAccessDep,
+    column_create: api.schemas.ColumnCreate,
+    session: api.dependencies.SessionDep,
+    response: Response,
+):
+    column = await api.db.create_column(session, board, **column_create.model_dump())
+    await api.events.publish(session, board.id, "column.created", column.id)
+    api.dependencies.set_version_etag(response, column)
 
+    return column
 
-@router.get("/columns/{column_id}", response_model=api.schemas.ColumnPublic)
+
+@router.get(
+    "/columns/{column_id}",
+    response_model=api.schemas.ColumnPublic,
+    dependencies=[Depends(api.dependencies.column_version_not_modified)],
+)
 async def get_column(
     board_and_column: api.dependencies.BoardColumnDep,
 ):
@@ -42,14 +88,47 @@ async def get_column(
 async def update_column(
     board_and_column: api.dependencies.BoardColumnDep,
     column_update: api.schemas.ColumnUpdate,
-    session: api.dependencies.SessionDep
+    session: api.dependencies.SessionDep,
+    response: Response,
+    if_match: api.dependencies.IfMatchDep = None,
 ):
     board, column = board_and_column
+    version = api.dependencies.get_expected_version(if_match, column_update.version)
 
     if not isinstance(column_update.position, api.schemas.UnsetType) and column_update.position != column.position:
-        validate_position(board, column_update.position)
+        await validate_position(session, board, column_update.position)
 
-    return api.db.update_column(session, column, column_update.model_dump(exclude_unset=True))
+    column = await api.db.update_column(
+        session, column, column_update.model_dump(exclude_unset=True, exclude={"version"}), version
+    )
+    await api.events.publish(session, board.id, "column.updated", column.id)
+    api.dependencies.set_version_etag(response, column)
+
+    return column
+
+
+@router.post("/columns/{column_id}/move", response_model=api.schemas.ColumnPublic)
+async def move_column(
+    board_and_column: api.dependencies.BoardColumnDep,
+    column_move: api.schemas.ColumnMove,
+    session: api.dependencies.SessionDep,
+    background_tasks: BackgroundTasks,
+    response: Response,
+):
+    board, column = board_and_column
+
+    after = await validate_sibling(session, column, column_move.after_id)
+    before = await validate_sibling(session, column, column_move.before_id)
+    if after is not None and before is not None and after.position >= before.position:
+        raise HTTPException(status.HTTP_409_CONFLICT, "after_id must be placed before before_id")
+
+    if await api.db.move_column(session, column, after, before):
+        background_tasks.add_task(api.db.rebalance_column_positions, board.id)
+
+    await api.events.publish(session, board.id, "column.moved", column.id)
+    api.dependencies.set_version_etag(response, column)
+
+    return column
 
 
 @router.delete("/columns/{column_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -57,5 +136,6 @@ async def delete_column(
     board_and_column: api.dependencies.BoardColumnDep,
     session: api.dependencies.SessionDep
 ) -> None:
-    _, column = board_and_column
-    api.db.delete_column(session, column)
+    board, column = board_and_column
+    await api.db.delete_column(session, column)
+    await api.events.publish(session, board.id, "column.deleted", column.id)
@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+import api.metrics
+
+router = APIRouter(tags=["metrics"])
+
+
+# Unauthenticated like most scrape targets, keep it off the public network, e.g. at the reverse proxy. Not async:
+# with several workers it reads their metric files.
+@router.get("/metrics", include_in_schema=False)
+def get_metrics() -> Response:
+    return Response(generate_latest(api.metrics.get_registry()), media_type=CONTENT_TYPE_LATEST)
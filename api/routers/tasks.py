@@ -1,14 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from contextlib import contextmanager
+from typing import Annotated, Any
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response, status
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 import api.db
 import api.dependencies
+import api.events
 import api.schemas
 
 router = APIRouter(tags=["tasks"])
 
 
-def validate_new_column(board: api.db.Board, new_column_id: int) -> api.db.Column:
-    new_column = api.db.get_column_by_id(new_column_id)
+async def validate_new_column(session: AsyncSession, board: api.db.Board, new_column_id: int) -> api.db.Column:
+    new_column = await api.db.get_column_by_id(session, new_column_id)
     if new_column is None:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Column not found")
 
@@ -18,44 +23,150 @@ def validate_new_column(board: api.db.Board, new_column_id: int) -> api.db.Colum
     return new_column
 
 
-def validate_new_position(column: api.db.Column, new_position: int):
+async def validate_new_position(session: AsyncSession, column: api.db.Column, new_position: int):
     if new_position < 0:
         raise HTTPException(status.HTTP_409_CONFLICT, "Position must be greater or equal 0")
+    if new_position > api.db.MAX_POSITION:
+        raise HTTPException(status.HTTP_409_CONFLICT, f"Position must be less or equal {api.db.MAX_POSITION}")
+
+    if await api.db.get_task_by_position(session, column, new_position) is not None:
+        raise HTTPException(status.HTTP_409_CONFLICT, "This position is already taken")
+
+
+async def validate_sibling(
+    session: AsyncSession,
+    column: api.db.Column,
+    task: api.db.Task,
+    sibling_id: int | None
+) -> api.db.Task | None:
+    if sibling_id is None:
+        return None
 
-    for task in api.db.get_tasks(column, dict()):
-        if task.position == new_position:
-            raise HTTPException(status.HTTP_409_CONFLICT, "This position is already taken")
+    sibling = await session.get(api.db.Task, sibling_id)
+    if sibling is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Task not found")
 
+    if sibling.column_id != column.id:
+        raise HTTPException(status.HTTP_409_CONFLICT, "This task is in another column")
 
-def validate_new_assignee(board: api.db.Board, assignee_id: int | None) -> api.db.User | None:
+    if sibling.id == task.id:
+        raise HTTPException(status.HTTP_409_CONFLICT, "Cannot place a task next to itself")
+
+    return sibling
+
+
+async def validate_new_assignee(
+    session: AsyncSession,
+    board: api.db.Board,
+    assignee_id: int | None
+) -> api.db.User | None:
     if assignee_id is None:
         return None
 
-    assigned_user = api.db.get_user_by_id(assignee_id)
+    assigned_user = await api.db.get_user_by_id(session, assignee_id)
     if assigned_user is None:
         raise HTTPException(status.HTTP_409_CONFLICT, "This user doesn't exist")
 
-    if not api.dependencies.check_user_access(assigned_user, board):
+    if not await api.dependencies.check_user_access(session, assigned_user, board):
         raise HTTPException(status.HTTP_409_CONFLICT, "This user doesn't have access to this board")
 
     return assigned_user
 
 
-@router.get("/columns/{column_id}/tasks/", response_model=list[api.schemas.TaskPublic])
+async def validate_details_update(
+    session: AsyncSession,
+    board: api.db.Board,
+    task: api.db.Task,
+    task_update: api.schemas.TaskUpdate | api.schemas.TaskBatchUpdate,
+) -> list[str]:
+    """Validates the name and assignee changes, returns the log entries describing them."""
+    logs = []
+
+    if not isinstance(task_update.name, api.schemas.UnsetType) and task.name != task_update.name:
+        logs.append(f"~~{task.name}~~ {task_update.name}")
+
+    if not isinstance(task_update.assignee_id, api.schemas.UnsetType) and task.assignee_id != task_update.assignee_id:
+        old_assigned_user = await api.db.get_user_by_id(session, task.assignee_id)
+        if old_assigned_user is not None:
+            logs.append(f"Unassigned {old_assigned_user.name}")
+
+        new_assigned_user = await validate_new_assignee(session, board, task_update.assignee_id)
+        if new_assigned_user is not None:
+            logs.append(f"Assigned {new_assigned_user.name}")
+
+    return logs
+
+
+async def validate_move(
+    session: AsyncSession,
+    board: api.db.Board,
+    column: api.db.Column,
+    task: api.db.Task,
+    task_move: api.schemas.TaskMove | api.schemas.TaskBatchMove,
+) -> tuple[api.db.Column, api.db.Task | None, api.db.Task | None]:
+    target_column = column
+    if task_move.column_id is not None and task_move.column_id != task.column_id:
+        target_column = await validate_new_column(session, board, task_move.column_id)
+
+    after = await validate_sibling(session, target_column, task, task_move.after_id)
+    before = await validate_sibling(session, target_column, task, task_move.before_id)
+    if after is not None and before is not None and after.position >= before.position:
+        raise HTTPException(status.HTTP_409_CONFLICT, "after_id must be placed before before_id")
+
+    return target_column, after, before
+
+
+def get_task_on_board(task: api.db.Task, column: api.db.Column) -> dict[str, Any]:
+    return {**task.model_dump(), "board_id": column.board_id}
+
+
+@router.get(
+    "/columns/{column_id}/tasks/",
+    response_model=api.schemas.Page[api.schemas.TaskPublic],
+    dependencies=[Depends(api.dependencies.column_not_modified)],
+)
 async def get_tasks(
     board_and_column: api.dependencies.BoardColumnDep,
-    filter: api.schemas.TaskFilter = Depends(),
+    session: api.dependencies.SessionDep,
+    pagination: api.dependencies.PaginationDep,
+    filter: Annotated[api.schemas.ColumnTaskFilter, Query()],
 ):
     _, column = board_and_column
 
-    # HTTP cannot serialize null value, so treat string "null" as null value
-    if filter.assignee_id == "null":
-        filter.assignee_id = None
+    items, next_cursor = await api.db.get_tasks(
+        session, column, filter.model_dump(exclude={"sort"}), filter.sort, pagination
+    )
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get(
+    "/boards/{board_id}/tasks/",
+    response_model=api.schemas.Page[api.schemas.TaskOnBoardPublic],
+    dependencies=[Depends(api.dependencies.board_not_modified)],
+)
+async def get_board_tasks(
+    board: api.dependencies.BoardCollaboratorAccessDep,
+    session: api.dependencies.SessionDep,
+    pagination: api.dependencies.PaginationDep,
+    filter: Annotated[api.schemas.BoardTaskFilter, Query()],
+):
+    items, next_cursor = await api.db.get_board_tasks(
+        session, board, filter.model_dump(exclude={"sort"}), filter.sort, pagination
+    )
+    return {"items": [get_task_on_board(task, column) for task, column in items], "next_cursor": next_cursor}
 
-    # model_dump(exclude_unset=True) is broken with Depends()
-    model_dump = {k: v for k, v in filter.model_dump().items() if not isinstance(v, api.schemas.UnsetType)}
 
-    return api.db.get_tasks(column, model_dump)
+@router.get("/users/me/tasks/", response_model=api.schemas.Page[api.schemas.TaskOnBoardPublic])
+async def get_assigned_tasks(
+    current_user: api.dependencies.CurrentUserDep,
+    session: api.dependencies.SessionDep,
+    pagination: api.dependencies.PaginationDep,
+    filter: Annotated[api.schemas.AssignedTaskFilter, Query()],
+):
+    items, next_cursor = await api.db.get_assigned_tasks(
+        session, current_user, filter.model_dump(exclude={"sort"}), filter.sort, pagination
+    )
+    return {"items": [get_task_on_board(task, column) for task, column in items], "next_cursor": next_cursor}
 
 
 @router.post("/columns/{column_id}/tasks/", status_code=status.HTTP_201_CREATED, response_model=api.schemas.TaskPublic)
@@ -63,15 +174,25 @@ async def add_task(
     board_and_column: api.dependencies.BoardColumnDep,
     task_create: api.schemas.TaskCreate,
     current_user: api.dependencies.CurrentUserDep,
+    session: api.dependencies.SessionDep,
+    response: Response,
 ):
     board, column = board_and_column
 
-    validate_new_assignee(board, task_create.assignee_id)
+    await validate_new_assignee(session, board, task_create.assignee_id)
+
+    task = await api.db.create_task(session, column, created_by=current_user.id, **task_create.model_dump())
+    await api.events.publish(session, board.id, "task.created", task.id)
+    api.dependencies.set_version_etag(response, task)
 
-    return api.db.create_task(column, created_by=current_user.id, **task_create.model_dump())
+    return task
 
 
-@router.get("/tasks/{task_id}", response_model=api.schemas.TaskPublic)
+@router.get(
+    "/tasks/{task_id}",
+    response_model=api.schemas.TaskPublic,
+    dependencies=[Depends(api.dependencies.task_version_not_modified)],
+)
 async def get_task(board_column_and_task: api.dependencies.BoardColumnTaskDep):
     _, _, task = board_column_and_task
     return task
@@ -82,42 +203,61 @@ async def update_task(
     board_column_and_task: api.dependencies.BoardColumnTaskDep,
     task_update: api.schemas.TaskUpdate,
     session: api.dependencies.SessionDep,
+    response: Response,
+    if_match: api.dependencies.IfMatchDep = None,
 ):
     board, column, task = board_column_and_task
+    version = api.dependencies.get_expected_version(if_match, task_update.version)
+
+    # Written with the update, once everything is validated
+    logs = []
 
+    target_column = column
     if not isinstance(task_update.column_id, api.schemas.UnsetType) and task.column_id != task_update.column_id:
-        new_column = validate_new_column(board, task_update.column_id)
+        target_column = await validate_new_column(session, board, task_update.column_id)
+        logs.append(f"Moved from {column.name} to {target_column.name}")
 
-        api.db.create_task_log(
-            task,
-            content=f"Moved from {column.name} to {new_column.name}",
-        )
+    if isinstance(task_update.position, api.schemas.UnsetType):
+        # Moved to another column without a position, append it there
+        if target_column is not column:
+            task_update.position = await api.db.get_next_task_position(session, target_column)
+    elif target_column is not column or task_update.position != task.position:
+        await validate_new_position(session, target_column, task_update.position)
 
-    if not isinstance(task_update.position, api.schemas.UnsetType) and task_update.position != task.position:
-        validate_new_position(column, task_update.position)
+    logs += await validate_details_update(session, board, task, task_update)
 
-    if not isinstance(task_update.name, api.schemas.UnsetType) and task.name != task_update.name:
-        api.db.create_task_log(
-            task,
-            content=f"~~{task.name}~~ {task_update.name}",
-        )
+    task = await api.db.update_task(
+        session, task, task_update.model_dump(exclude_unset=True, exclude={"version"}), version
+    )
+    await api.db.create_task_logs(session, [(task, content) for content in logs])
+    await api.events.publish(session, board.id, "task.updated", task.id)
+    api.dependencies.set_version_etag(response, task)
 
-    if not isinstance(task_update.assignee_id, api.schemas.UnsetType) and task.assignee_id != task_update.assignee_id:
-        old_assigned_user = api.db.get_user_by_id(task.assignee_id)
-        if old_assigned_user is not None:
-            api.db.create_task_log(
-                task,
-                content=f"Unassigned {old_assigned_user.name}"
-            )
+    return task
 
-        new_assigned_user = validate_new_assignee(board, task_update.assignee_id)
-        if new_assigned_user is not None:
-            api.db.create_task_log(
-                task,
-                content=f"Assigned {new_assigned_user.name}",
-            )
 
-    return api.db.update_task(session, task, task_update.model_dump(exclude_unset=True))
+@router.post("/tasks/{task_id}/move", response_model=api.schemas.TaskPublic)
+async def move_task(
+    board_column_and_task: api.dependencies.BoardColumnTaskDep,
+    task_move: api.schemas.TaskMove,
+    session: api.dependencies.SessionDep,
+    background_tasks: BackgroundTasks,
+    response: Response,
+):
+    board, column, task = board_column_and_task
+
+    target_column, after, before = await validate_move(session, board, column, task, task_move)
+
+    if await api.db.move_task(session, task, target_column, after, before):
+        background_tasks.add_task(api.db.rebalance_task_positions, target_column.id)
+
+    if target_column is not column:
+        await api.db.create_task_logs(session, [(task, f"Moved from {column.name} to {target_column.name}")])
+
+    await api.events.publish(session, board.id, "task.moved", task.id)
+    api.dependencies.set_version_etag(response, task)
+
+    return task
 
 
 @router.delete("/tasks/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -125,11 +265,211 @@ async def delete_task(
     board_column_and_task: api.dependencies.BoardColumnTaskDep,
     session: api.dependencies.SessionDep,
 ):
-    _, _, task = board_column_and_task
-    api.db.delete_task(session, task)
+    board, _, task = board_column_and_task
+    await api.db.delete_task(session, task)
+    await api.events.publish(session, board.id, "task.deleted", task.id)
 
 
-@router.get("/tasks/{task_id}/logs/", response_model=list[api.schemas.TaskLogPublic])
-async def get_logs(board_column_and_task: api.dependencies.BoardColumnTaskDep):
+@router.get(
+    "/tasks/{task_id}/logs/",
+    response_model=api.schemas.Page[api.schemas.TaskLogPublic],
+    dependencies=[Depends(api.dependencies.task_not_modified)],
+)
+async def get_logs(
+    board_column_and_task: api.dependencies.BoardColumnTaskDep,
+    session: api.dependencies.SessionDep,
+    pagination: api.dependencies.PaginationDep
+):
     _, _, task = board_column_and_task
-    return api.db.get_task_logs(task)
+
+    items, next_cursor = await api.db.get_task_logs(session, task, pagination)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@contextmanager
+def batch_operation(index: int):
+    # Tells which operation of the batch failed
+    try:
+        yield
+    except HTTPException as exc:
+        raise HTTPException(exc.status_code, f"operations[{index}]: {exc.detail}") from exc
+
+
+def get_batch_task(tasks: dict[int, api.db.Task], task_id: int) -> api.db.Task:
+    task = tasks.get(task_id)
+    if task is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Task not found")
+
+    return task
+
+
+@router.get("/boards/{board_id}/search", response_model=api.schemas.Page[api.schemas.TaskSearchResult])
+async def search_tasks(
+    board: api.dependencies.BoardCollaboratorAccessDep,
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    session: api.dependencies.SessionDep,
+    pagination: api.dependencies.PaginationDep,
+    include_logs: bool = False,
+):
+    """Tasks of the board matching `q` in their name or description, or their logs with `include_logs`."""
+    items, next_cursor = await api.db.search_tasks(session, board, q, include_logs, pagination)
+    return {"items": [{**task.model_dump(), "rank": rank} for task, rank in items], "next_cursor": next_cursor}
+
+
+@router.post("/boards/{board_id}/tasks:batch", response_model=api.schemas.TaskBatchPublic)
+async def batch_tasks(
+    board: api.dependencies.BoardCollaboratorAccessDep,
+    task_batch: api.schemas.TaskBatch,
+    current_user: api.dependencies.CurrentUserDep,
+    session: api.dependencies.SessionDep,
+    background_tasks: BackgroundTasks,
+):
+    """Applies all the operations in one transaction, or none of them.
+
+    Updates are applied first, then moves, then creations (appended to their columns) and deletions last,
+    each kind in the order of the request.
+    """
+    operations = task_batch.operations
+
+    # Locks the board first, so nothing loaded below changes until the batch is committed
+    await api.db.next_revision(session, board.id)
+
+    # Load everything the operations refer to with one query per table,
+    # validation then finds it in the session. Keep references, the session only holds weak ones.
+    task_ids = set()
+    column_ids = set()
+    user_ids = set()
+    for operation in operations:
+        if isinstance(operation, api.schemas.TaskBatchCreate):
+            column_ids.add(operation.column_id)
+            user_ids.add(operation.assignee_id)
+        else:
+            task_ids.add(operation.id)
+
+        if isinstance(operation, api.schemas.TaskBatchMove):
+            column_ids.add(operation.column_id)
+            task_ids |= {operation.after_id, operation.before_id}
+        elif isinstance(operation, api.schemas.TaskBatchUpdate):
+            if not isinstance(operation.assignee_id, api.schemas.UnsetType):
+                user_ids.add(operation.assignee_id)
+
+    tasks = await api.db.get_tasks_by_ids(session, board, task_ids - {None})
+    column_ids |= {task.column_id for task in tasks.values()}
+    columns = await api.db.get_columns_by_ids(session, board, column_ids - {None})
+    user_ids |= {task.assignee_id for task in tasks.values()}
+    users = await api.db.get_users_by_ids(session, user_ids - {None})
+
+    # The task each operation applies to, by operation index
+    batch_tasks: dict[int, api.db.Task] = {}
+    logs: list[tuple[api.db.Task, str]] = []
+
+    updates: dict[int, tuple[api.db.Task, dict[str, Any]]] = {}
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, api.schemas.TaskBatchUpdate):
+            continue
+
+        with batch_operation(index):
+            task = get_batch_task(tasks, operation.id)
+            if task.id in updates:
+                raise HTTPException(status.HTTP_409_CONFLICT, "Task is updated more than once")
+            # Loaded after locking the board, the version is current
+            if operation.version is not None and task.version != operation.version:
+                raise HTTPException(status.HTTP_409_CONFLICT, f"Task was changed since version {operation.version}")
+
+            for content in await validate_details_update(session, board, task, operation):
+                logs.append((task, content))
+
+        updates[task.id] = task, operation.model_dump(exclude_unset=True, exclude={"op", "id", "version"})
+        batch_tasks[index] = task
+
+    await api.db.update_tasks(session, list(updates.values()))
+
+    # Appends to the same column are flushed together, until an operation needs to see them
+    appending_column = None
+    appending: dict[int, api.db.Task] = {}
+    crowded_column_ids = set()
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, api.schemas.TaskBatchMove):
+            continue
+
+        with batch_operation(index):
+            task = get_batch_task(tasks, operation.id)
+
+            appends = operation.after_id is None and operation.before_id is None
+            target_column_id = operation.column_id if operation.column_id is not None else task.column_id
+            if appending and not (appends and appending_column.id == target_column_id and task.id not in appending):
+                await api.db.append_tasks(session, appending_column, list(appending.values()))
+                appending = {}
+
+            column = columns[task.column_id]
+            target_column, after, before = await validate_move(session, board, column, task, operation)
+            if target_column is not column:
+                logs.append((task, f"Moved from {column.name} to {target_column.name}"))
+
+            if appends:
+                appending_column = target_column
+                appending[task.id] = task
+            elif await api.db.move_task(session, task, target_column, after, before):
+                crowded_column_ids.add(target_column.id)
+
+        batch_tasks[index] = task
+
+    if appending:
+        await api.db.append_tasks(session, appending_column, list(appending.values()))
+
+    for column_id in crowded_column_ids:
+        background_tasks.add_task(api.db.rebalance_task_positions, column_id)
+
+    creates: dict[int, list[int]] = {}
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, api.schemas.TaskBatchCreate):
+            continue
+
+        with batch_operation(index):
+            if operation.column_id not in columns:
+                raise HTTPException(status.HTTP_404_NOT_FOUND, "Column not found")
+
+            await validate_new_assignee(session, board, operation.assignee_id)
+
+        creates.setdefault(operation.column_id, []).append(index)
+
+    # Assignees are all validated
+    del users
+
+    for column_id, indexes in creates.items():
+        new_tasks = await api.db.create_tasks(session, columns[column_id], [
+            dict(operations[index].model_dump(exclude={"op", "column_id"}), created_by=current_user.id)
+            for index in indexes
+        ])
+        batch_tasks.update(zip(indexes, new_tasks))
+
+    deletes: dict[int, api.db.Task] = {}
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, api.schemas.TaskBatchDelete):
+            continue
+
+        with batch_operation(index):
+            task = get_batch_task(tasks, operation.id)
+
+        deletes[task.id] = task
+        batch_tasks[index] = task
+
+    await api.db.delete_tasks(session, list(deletes.values()))
+
+    logs = [(task, content) for task, content in logs if task.id not in deletes]
+    task_logs = await api.db.create_task_logs(session, logs)
+
+    # One event for the whole batch, clients fetch the changes anyway
+    await api.events.publish(session, board.id, "tasks.batch")
+
+    return {
+        "results": [
+            {
+                "op": operation.op,
+                "id": batch_tasks[index].id,
+                "task": batch_tasks[index] if batch_tasks[index].id not in deletes else None,
+            }
+            for index, operation in enumerate(operations)
+        ],
+        "logs": task_logs,
+    }
@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, status
 
 import api.db
 import api.dependencies
+import api.events
 import api.schemas
 import api.utils
 
@@ -14,8 +15,8 @@ async def get_user_me(current_user: api.dependencies.CurrentUserDep):
 
 
 @router.get("/users/{user_id}", response_model=api.schemas.UserPublic)
-async def get_user(_: api.dependencies.CurrentUserDep, user_id: int):
-    user = api.db.get_user_by_id(user_id)
+async def get_user(_: api.dependencies.CurrentUserDep, user_id: int, session: api.dependencies.SessionDep):
+    user = await api.db.get_user_by_id(session, user_id)
     if user is None:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "User not found")
 
@@ -31,6 +32,13 @@ async def edit_user_me(
     to_update = user_update.model_dump(exclude_unset=True, exclude={"password"})
 
     if not isinstance(user_update.password, api.schemas.UnsetType):
-        to_update["hashed_password"] = api.utils.get_password_hash(user_update.password)
+        to_update["hashed_password"] = await api.utils.get_password_hash(user_update.password)
+        to_update["token_version"] = current_user.token_version + 1
 
-    return api.db.update_user(session, current_user, to_update)
+    # Boards show the user's name. Touched before the user row is changed, so boards are locked first, as elsewhere
+    board_ids = await api.db.touch_user_boards(session, current_user.id) if "name" in to_update else []
+    user = await api.db.update_user(session, current_user, to_update)
+    for board_id in board_ids:
+        await api.events.publish(session, board_id, "user.updated", current_user.id)
+
+    return user
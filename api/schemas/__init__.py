@@ -1,7 +1,31 @@
-from .board import BoardCreate, BoardPublic, BoardUpdate
+from .board import BoardCreate, BoardFullPublic, BoardPublic, BoardUpdate
 from .board_user_access import BoardUserAccessPublic
-from .column import ColumnCreate, ColumnPublic, ColumnUpdate
-from .task import TaskCreate, TaskFilter, TaskPublic, TaskUpdate
+from .changes import BoardChangesPublic, TaskChangePublic
+from .column import ColumnCreate, ColumnFullPublic, ColumnMove, ColumnPublic, ColumnUpdate
+from .page import Page
+from .task import (
+    AssignedTaskFilter,
+    BoardTaskFilter,
+    ColumnTaskFilter,
+    TaskCreate,
+    TaskFilter,
+    TaskMove,
+    TaskOnBoardPublic,
+    TaskPublic,
+    TaskSearchResult,
+    TaskSort,
+    TaskUpdate,
+)
+from .task_batch import (
+    TaskBatch,
+    TaskBatchCreate,
+    TaskBatchDelete,
+    TaskBatchLogPublic,
+    TaskBatchMove,
+    TaskBatchPublic,
+    TaskBatchResult,
+    TaskBatchUpdate,
+)
 from .task_log import TaskLogPublic
 from .token import Token
 from .unset_type import UnsetType, Unset
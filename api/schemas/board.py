@@ -1,12 +1,23 @@
 from pydantic import BaseModel
 
+from .column import ColumnFullPublic
 from .unset_type import Unset, UnsetType
+from .user import UserPublic
 
 
 class BoardPublic(BaseModel):
     id: int
     name: str
     owner_id: int
+    # Send it back with changes, see BoardUpdate
+    version: int
+
+
+class BoardFullPublic(BoardPublic):
+    # Pass as `since` to /boards/{board_id}/changes to get what changed after this snapshot
+    revision: int
+    columns: list[ColumnFullPublic]
+    users: list[UserPublic]
 
 
 class BoardCreate(BaseModel):
@@ -15,3 +26,6 @@ class BoardCreate(BaseModel):
 
 class BoardUpdate(BaseModel):
     name: UnsetType | str = Unset
+    # The version the change was made against, rejected with 409 if the board was changed since. Also as If-Match,
+    # with the ETag of the responses about the board alone, e.g. GET /boards/{board_id}
+    version: int | None = None
@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+
+from .board import BoardPublic
+from .column import ColumnPublic
+from .task import TaskPublic
+from .user import UserPublic
+
+
+class TaskChangePublic(TaskPublic):
+    # Changes when the task is moved to another column
+    column_id: int
+
+
+class BoardChangesPublic(BaseModel):
+    # Pass as `since` on the next poll
+    revision: int
+    board: BoardPublic
+    columns: list[ColumnPublic]
+    tasks: list[TaskChangePublic]
+    # The owner, and the members added or changed
+    users: list[UserPublic]
+    # Tasks of a deleted column are gone too, they aren't listed separately
+    deleted_column_ids: list[int]
+    deleted_task_ids: list[int]
+    # Members removed from the board, and not added back since
+    removed_user_ids: list[int]
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 
+from .task import TaskPublic
 from .unset_type import Unset, UnsetType
 
 
@@ -7,6 +8,11 @@ class ColumnPublic(BaseModel):
     id: int
     position: int
     name: str
+    version: int
+
+
+class ColumnFullPublic(ColumnPublic):
+    tasks: list[TaskPublic]
 
 
 class ColumnCreate(BaseModel):
@@ -16,3 +22,11 @@ class ColumnCreate(BaseModel):
 class ColumnUpdate(BaseModel):
     position: UnsetType | int = Unset
     name: UnsetType | str = Unset
+    # See BoardUpdate
+    version: int | None = None
+
+
+class ColumnMove(BaseModel):
+    # Sibling columns to place the column between, moves to the end of the board if both are omitted
+    after_id: int | None = None
+    before_id: int | None = None
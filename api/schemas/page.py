@@ -0,0 +1,11 @@
+from typing import Generic, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    # Pass as `after` to get the next page, null on the last page
+    next_cursor: str | None
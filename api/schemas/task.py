@@ -1,6 +1,7 @@
 from datetime import datetime
+from typing import Any, Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 
 from .unset_type import Unset, UnsetType
 
@@ -13,6 +14,19 @@ class TaskPublic(BaseModel):
     assignee_id: int | None
     created_at: datetime
     created_by: int
+    version: int
+
+
+class TaskOnBoardPublic(TaskPublic):
+    # Listings spanning several columns or boards tell where each task is
+    board_id: int
+    column_id: int
+
+
+class TaskSearchResult(TaskPublic):
+    column_id: int
+    # Higher is more relevant, only comparable within the results of one search
+    rank: float
 
 
 class TaskCreate(BaseModel):
@@ -27,8 +41,57 @@ class TaskUpdate(BaseModel):
     name: UnsetType | str = Unset
     description: UnsetType | str | None = Unset
     assignee_id: UnsetType | int | None = Unset
+    # See BoardUpdate
+    version: int | None = None
+
+
+class TaskMove(BaseModel):
+    # Target column, the current one if omitted
+    column_id: int | None = None
+    # Sibling tasks to place the task between, moves to the end of the column if both are omitted
+    after_id: int | None = None
+    before_id: int | None = None
+
+
+# Orders of the task listings, "-" for descending. Ties are broken by id.
+# - position: the order of the board, by column then position in the column, then by board across boards
+# - created_at: oldest first
+TaskSort = Literal["position", "created_at", "-created_at"]
 
 
 class TaskFilter(BaseModel):
-    assignee_id: UnsetType | int | str | None = Unset
-    created_by: UnsetType | int = Unset
+    """Filters of every task listing, omitted ones don't filter."""
+    created_by: int | None = None
+    # Created at or after created_after, and strictly before created_before
+    created_after: datetime | None = None
+    created_before: datetime | None = None
+    sort: TaskSort = "position"
+
+
+class ColumnTaskFilter(TaskFilter):
+    # Tasks assigned to any of these users, or to nobody with unassigned. All tasks if neither is given.
+    assignee_id: list[int] = []
+    unassigned: bool = False
+
+    @model_validator(mode="before")
+    @classmethod
+    def parse_null_assignee(cls, data: Any) -> Any:
+        # Query strings have no null, clients used to ask for the unassigned tasks with assignee_id=null
+        if isinstance(data, dict) and "null" in (assignee_ids := data.get("assignee_id") or []):
+            data = {
+                **data,
+                "assignee_id": [assignee_id for assignee_id in assignee_ids if assignee_id != "null"],
+                "unassigned": True,
+            }
+
+        return data
+
+
+class BoardTaskFilter(ColumnTaskFilter):
+    # Tasks of these columns of the board, all of them if omitted
+    column_id: list[int] = []
+
+
+class AssignedTaskFilter(TaskFilter):
+    # Tasks of these boards, all of the user's if omitted
+    board_id: list[int] = []
@@ -0,0 +1,70 @@
+from datetime import datetime
+from typing import Annotated, Literal
+
+from pydantic import BaseModel, Field
+
+from .task import TaskPublic
+from .unset_type import Unset, UnsetType
+
+MAX_BATCH_SIZE = 500
+
+
+class TaskBatchCreate(BaseModel):
+    op: Literal["create"]
+    column_id: int
+    name: str
+    description: str | None = None
+    assignee_id: int | None = None
+
+
+class TaskBatchUpdate(BaseModel):
+    op: Literal["update"]
+    id: int
+    name: UnsetType | str = Unset
+    description: UnsetType | str | None = Unset
+    assignee_id: UnsetType | int | None = Unset
+    # Same as TaskUpdate
+    version: int | None = None
+
+
+class TaskBatchMove(BaseModel):
+    op: Literal["move"]
+    id: int
+    # Same as TaskMove
+    column_id: int | None = None
+    after_id: int | None = None
+    before_id: int | None = None
+
+
+class TaskBatchDelete(BaseModel):
+    op: Literal["delete"]
+    id: int
+
+
+TaskBatchOperation = Annotated[
+    TaskBatchCreate | TaskBatchUpdate | TaskBatchMove | TaskBatchDelete,
+    Field(discriminator="op"),
+]
+
+
+class TaskBatch(BaseModel):
+    operations: list[TaskBatchOperation] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class TaskBatchResult(BaseModel):
+    op: str
+    id: int
+    # The task after the whole batch, null if it was deleted
+    task: TaskPublic | None
+
+
+class TaskBatchLogPublic(BaseModel):
+    task_id: int
+    content: str
+    created_at: datetime
+
+
+class TaskBatchPublic(BaseModel):
+    # In the order of the operations
+    results: list[TaskBatchResult]
+    logs: list[TaskBatchLogPublic]
@@ -0,0 +1,89 @@
+"""Production entry point, runs the API in several uvicorn worker processes.
+
+    python -m api.serve
+
+Each worker has its own connection pool, size them together, see api.db.db. Several workers need EVENTS_BROKER=postgres,
+otherwise the clients of one worker never get the events of the changes the others handle, see api.events.
+
+Each worker also caches users and board access for USER_CACHE_TTL and ACCESS_CACHE_TTL seconds. A password change, a
+logout everywhere or a member removal is effective at once on the worker that handled it, and on the others only once
+their entries expire.
+"""
+
+import asyncio
+import copy
+import os
+from os import getenv
+from pathlib import Path
+import tempfile
+
+import uvicorn
+
+HOST = getenv("HOST", "0.0.0.0")
+PORT = int(getenv("PORT", "8000"))
+# Worker processes, one per CPU core by default
+WEB_CONCURRENCY = int(getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+# Seconds to wait for open requests on shutdown, event streams never finish on their own
+GRACEFUL_SHUTDOWN_TIMEOUT = int(getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "10"))
+# Of the API's own loggers, e.g. DEBUG, INFO for the query statistics of SQL_STATS, WARNING
+LOG_LEVEL = getenv("LOG_LEVEL", "INFO")
+
+
+async def check_schema_version() -> None:
+    import api.db
+
+    await api.db.check_schema_version()
+    await api.db.engine.dispose()
+
+
+def check_events_broker() -> None:
+    import api.events
+
+    if WEB_CONCURRENCY > 1 and api.events.EVENTS_BROKER == "local":
+        raise SystemExit(
+            f"{WEB_CONCURRENCY} workers with EVENTS_BROKER=local would drop the events of the other workers, "
+            "set EVENTS_BROKER=postgres or WEB_CONCURRENCY=1"
+        )
+
+
+def prepare_metrics_dir() -> None:
+    # prometheus_client reads it when imported, before any import of api.metrics, see there
+    metrics_dir = getenv("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir is None:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="api-metrics-")
+        return
+
+    # The files of a previous run would add up with the new ones
+    Path(metrics_dir).mkdir(parents=True, exist_ok=True)
+    for path in Path(metrics_dir).glob("*.db"):
+        path.unlink()
+
+
+def get_log_config() -> dict:
+    # uvicorn only sets up its own loggers, the API's log through the same handler
+    log_config = copy.deepcopy(uvicorn.config.LOGGING_CONFIG)
+    log_config["loggers"]["api"] = {"handlers": ["default"], "level": LOG_LEVEL}
+
+    return log_config
+
+
+def main() -> None:
+    prepare_metrics_dir()
+    # Fail before starting the workers, uvicorn would restart failing ones forever
+    check_events_broker()
+    asyncio.run(check_schema_version())
+
+    uvicorn.run(
+        "api.main:app",
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        # Behind a reverse proxy, trusted per FORWARDED_ALLOW_IPS
+        proxy_headers=True,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT,
+        log_config=get_log_config(),
+    )
+
+
+if __name__ == "__main__":
+    main()
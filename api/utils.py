@@ -1,8 +1,26 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from os import getenv
+
 import bcrypt
 
+import api.metrics
 
 HASH_ALGORITHM = "HS256"
 
+# bcrypt cost factor for new hashes; existing hashes with another cost are upgraded on the next login
+PASSWORD_HASH_ROUNDS = int(getenv("PASSWORD_HASH_ROUNDS", "12"))
+# How many hashes may be computed at once, bcrypt releases the GIL so threads run in parallel
+PASSWORD_HASH_CONCURRENCY = int(getenv("PASSWORD_HASH_CONCURRENCY", "4"))
+
+password_hash_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_CONCURRENCY,
+    thread_name_prefix="password-hash",
+)
+
+# Where the secret files are, e.g. /run/secrets with Docker secrets
+SECRETS_DIR = getenv("SECRETS_DIR", "secrets")
+
 secrets_cache: dict[str, str] = dict()
 
 
@@ -11,7 +29,7 @@ def read_secret(secret_name: str) -> str | None:
         return secrets_cache[secret_name]
 
     try:
-        with open(f"secrets/{secret_name}") as file:
+        with open(f"{SECRETS_DIR}/{secret_name}") as file:
             secret_content = file.read()
             secrets_cache[secret_name] = secret_content
 
@@ -21,5 +39,29 @@ def read_secret(secret_name: str) -> str | None:
         return None
 
 
-def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+def _hash_password(password: str) -> str:
+    with api.metrics.password_hash_duration.labels("hash").time():
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(PASSWORD_HASH_ROUNDS)).decode()
+
+
+def _check_password(plain_password: str, hashed_password: str) -> bool:
+    with api.metrics.password_hash_duration.labels("check").time():
+        return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
+
+
+async def get_password_hash(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(password_hash_executor, _hash_password, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(
+        password_hash_executor,
+        _check_password,
+        plain_password,
+        hashed_password,
+    )
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    # bcrypt hashes look like $2b$<rounds>$<salt and hash>
+    return int(hashed_password.split("$")[2]) != PASSWORD_HASH_ROUNDS
@@ -0,0 +1,63 @@
+"""Measures how long a fresh worker process takes to import the app and run its startup, and the queries it makes.
+
+Every run is a new interpreter, like a worker being started or reloaded. Run from the repository root against a
+migrated database, with the same environment as the API:
+
+    python -m benchmarks.cold_start --runs 10
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Runs in the fresh interpreter, prints its timings as JSON
+WORKER = """
+import asyncio
+import json
+import time
+
+start = time.perf_counter()
+
+from api.main import app
+import api.db
+
+imported = time.perf_counter()
+
+
+async def main():
+    query_counter = api.db.start_query_counter()
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+
+    print(json.dumps({
+        "import_ms": (imported - start) * 1000,
+        "startup_ms": (started - imported) * 1000,
+        "queries": query_counter.queries,
+    }))
+
+
+asyncio.run(main())
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="worker starts to measure")
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, "-c", WORKER], capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+
+    for key in ("import_ms", "startup_ms"):
+        values = sorted(run[key] for run in runs)
+        print(f"{key}: median {statistics.median(values):.1f}, min {values[0]:.1f}, max {values[-1]:.1f}")
+
+    print(f"queries at startup: {runs[0]['queries']}")
+
+
+if __name__ == "__main__":
+    main()
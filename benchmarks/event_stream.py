@@ -0,0 +1,126 @@
+"""Follows the event stream of a board as a member while the owner changes it, and checks every event arrives.
+
+The stream must end cleanly once the owner removes the member. Run from the repository root against a scratch,
+migrated database, with the same environment as the API:
+
+    python -m benchmarks.event_stream
+
+DATABASE_URL=sqlite+aiosqlite:///:memory: runs it without a database server. The stream is read straight from the
+ASGI app, httpx's ASGI transport only returns responses once they are complete.
+"""
+
+import asyncio
+import uuid
+
+import httpx
+
+from api.main import app
+
+TIMEOUT = 10
+
+
+async def register(client: httpx.AsyncClient) -> tuple[int, dict[str, str]]:
+    username = f"events-{uuid.uuid4().hex[:12]}"
+    response = await client.post("/register", json={"username": username, "name": username, "password": "events"})
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    return (await client.get("/users/me", headers=headers)).json()["id"], headers
+
+
+class EventStream:
+    """GET /boards/{board_id}/events, with the event types in the order they arrive."""
+
+    def __init__(self, board_id: int, headers: dict[str, str]) -> None:
+        self.scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": f"/boards/{board_id}/events",
+            "raw_path": f"/boards/{board_id}/events".encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", b"events")] + [
+                (name.lower().encode(), value.encode()) for name, value in headers.items()
+            ],
+            "client": ("127.0.0.1", 0),
+            "server": ("events", 80),
+        }
+        self.types: asyncio.Queue[str] = asyncio.Queue()
+        self.buffer = ""
+        self.disconnected = asyncio.Event()
+        self.request_sent = False
+        self.task = asyncio.create_task(app(self.scope, self.receive, self.send))
+
+    async def receive(self) -> dict:
+        if not self.request_sent:
+            self.request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message: dict) -> None:
+        if message["type"] == "http.response.start" and message["status"] != 200:
+            raise SystemExit(f"The stream answered {message['status']}")
+
+        if message["type"] == "http.response.body":
+            self.buffer += message.get("body", b"").decode()
+            while "\n\n" in self.buffer:
+                event, self.buffer = self.buffer.split("\n\n", 1)
+                for line in event.splitlines():
+                    if line.startswith("event:"):
+                        self.types.put_nowait(line.removeprefix("event:").strip())
+
+    async def expect(self, event_type: str) -> None:
+        received = await asyncio.wait_for(self.types.get(), TIMEOUT)
+        print(f"received {received}")
+        if received != event_type:
+            raise SystemExit(f"Expected {event_type}, received {received}")
+
+
+async def main() -> None:
+    # Runs the startup of the app, which also starts the events broker and creates the tables of an in-memory database
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://events", timeout=TIMEOUT) as client:
+            _, owner_headers = await register(client)
+            member_id, member_headers = await register(client)
+
+            board = (await client.post("/boards/", json={"name": "events"}, headers=owner_headers)).json()
+            column = (await client.post(
+                f"/boards/{board['id']}/columns/", json={"name": "events"}, headers=owner_headers
+            )).json()
+            (await client.post(
+                f"/boards/{board['id']}/users/", params={"user_id": member_id}, headers=owner_headers
+            )).raise_for_status()
+
+            stream = EventStream(board["id"], member_headers)
+            await stream.expect("ready")
+
+            (await client.post(
+                f"/columns/{column['id']}/tasks/",
+                json={"name": "task", "description": None, "assignee_id": None},
+                headers=owner_headers,
+            )).raise_for_status()
+            await stream.expect("task.created")
+
+            (await client.patch(
+                f"/boards/{board['id']}", json={"name": "renamed"}, headers=owner_headers
+            )).raise_for_status()
+            await stream.expect("board.updated")
+
+            (await client.delete(
+                f"/boards/{board['id']}/users/", params={"user_id": member_id}, headers=owner_headers
+            )).raise_for_status()
+            await stream.expect("member.removed")
+
+            # Raises what the stream raised, if it crashed
+            await asyncio.wait_for(stream.task, TIMEOUT)
+            print("stream ended")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,267 @@
+"""Load test of the API: seeds a realistic dataset, then runs scripted scenarios against the app with many clients.
+
+Run from the repository root against a scratch, migrated database, with the same environment as the API:
+
+    python -m benchmarks.load --users 2000 --boards 5 --columns 20 --tasks 2000 --logs 20 --concurrency 20
+
+DATABASE_URL=sqlite+aiosqlite:///:memory: runs it without a database server. The data is seeded through the api.db
+helpers, the scenarios go through the whole app, in process:
+
+- login: logins of random users, dominated by password hashing, see PASSWORD_HASH_ROUNDS
+- render: full board reads by random members
+- drag: moves of random cards between and within the columns of a board
+- reassign: batches assigning random cards of a board to one member
+
+Each scenario reports the latency percentiles, the throughput and the average number of queries per request. It runs
+on its own, so the numbers don't depend on the other scenarios.
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import timedelta
+import random
+import statistics
+import time
+from typing import Awaitable, Callable
+import uuid
+
+import httpx
+from sqlalchemy import event
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import api.db
+import api.utils
+from api.main import app
+from api.routers.auth import ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token
+
+PASSWORD = "load"
+
+
+@dataclass
+class SeededBoard:
+    id: int
+    member_ids: list[int]
+    # Task ids of each column, in order, kept up to date by the drag scenario
+    columns: dict[int, list[int]]
+
+
+@dataclass
+class Dataset:
+    usernames: dict[int, str]
+    boards: list[SeededBoard]
+
+
+@dataclass
+class Result:
+    latencies: list[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+
+
+async def seed(args: argparse.Namespace) -> Dataset:
+    prefix = f"load-{uuid.uuid4().hex[:8]}"
+    # The same password for everyone, hashing thousands of them would take minutes
+    hashed_password = await api.utils.get_password_hash(PASSWORD)
+
+    # Commits after each board, which would otherwise expire the users
+    async with AsyncSession(api.db.engine, expire_on_commit=False) as session:
+        users = [
+            await api.db.register_user(
+                session, username=f"{prefix}-{index}", name=f"Load user {index}", hashed_password=hashed_password
+            )
+            for index in range(args.users)
+        ]
+        await api.db.commit(session)
+        usernames = {user.id: user.username for user in users}
+
+        boards = []
+        tasks_per_column = max(args.tasks // args.columns, 1)
+        for board_index in range(args.boards):
+            owner, *members = random.sample(users, min(args.members + 1, len(users)))
+            board = await api.db.create_board(session, owner, name=f"Load board {board_index}")
+            for member in members:
+                await api.db.add_user(session, board, member.id)
+
+            member_ids = [owner.id] + [member.id for member in members]
+            columns = {}
+            for column_index in range(args.columns):
+                column = await api.db.create_column(session, board, name=f"Column {column_index}")
+                tasks = await api.db.create_tasks(session, column, [
+                    {
+                        "name": f"Task {column_index}.{task_index}",
+                        "description": "Lorem ipsum dolor sit amet " * 4,
+                        "assignee_id": random.choice(member_ids + [None]),
+                        "created_by": owner.id,
+                    }
+                    for task_index in range(tasks_per_column)
+                ])
+                await api.db.create_task_logs(session, [
+                    (task, f"Log entry {log_index} of {task.name}, with some more words to make it realistic")
+                    for task in tasks
+                    for log_index in range(args.logs)
+                ])
+                columns[column.id] = [task.id for task in tasks]
+
+            await api.db.commit(session)
+            boards.append(SeededBoard(id=board.id, member_ids=member_ids, columns=columns))
+
+    return Dataset(usernames=usernames, boards=boards)
+
+
+def get_headers(dataset: Dataset, user_id: int) -> dict[str, str]:
+    # Signed here rather than with a login, which would measure the password hashing in every scenario
+    token = create_access_token(
+        data={"sub": dataset.usernames[user_id], "uid": user_id, "ver": 0},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+
+    return {"Authorization": f"Bearer {token.access_token}"}
+
+
+async def login(client: httpx.AsyncClient, dataset: Dataset) -> httpx.Response:
+    username = random.choice(list(dataset.usernames.values()))
+
+    return await client.post("/token", data={"username": username, "password": PASSWORD})
+
+
+async def render(client: httpx.AsyncClient, dataset: Dataset) -> httpx.Response:
+    board = random.choice(dataset.boards)
+
+    return await client.get(f"/boards/{board.id}/full", headers=get_headers(dataset, random.choice(board.member_ids)))
+
+
+async def drag(client: httpx.AsyncClient, dataset: Dataset) -> httpx.Response:
+    board = random.choice(dataset.boards)
+    source = random.choice([column_id for column_id, task_ids in board.columns.items() if task_ids])
+    target = random.choice(list(board.columns))
+    task_id = random.choice(board.columns[source])
+
+    siblings = [sibling_id for sibling_id in board.columns[target] if sibling_id != task_id]
+    index = random.randint(0, len(siblings))
+    after_id = siblings[index - 1] if index > 0 else None
+    before_id = siblings[index] if index < len(siblings) else None
+
+    response = await client.post(
+        f"/tasks/{task_id}/move",
+        json={"column_id": target, "after_id": after_id, "before_id": before_id},
+        headers=get_headers(dataset, random.choice(board.member_ids)),
+    )
+
+    # Applied to the current order, concurrent drags may have changed it since
+    if response.status_code == 200:
+        for task_ids in board.columns.values():
+            if task_id in task_ids:
+                task_ids.remove(task_id)
+
+        task_ids = board.columns[target]
+        if after_id in task_ids:
+            task_ids.insert(task_ids.index(after_id) + 1, task_id)
+        elif before_id in task_ids:
+            task_ids.insert(task_ids.index(before_id), task_id)
+        else:
+            task_ids.append(task_id)
+
+    return response
+
+
+async def reassign(client: httpx.AsyncClient, dataset: Dataset, batch_size: int) -> httpx.Response:
+    board = random.choice(dataset.boards)
+    task_ids = [task_id for task_ids in board.columns.values() for task_id in task_ids]
+    assignee_id = random.choice(board.member_ids)
+
+    return await client.post(
+        f"/boards/{board.id}/tasks:batch",
+        json={"operations": [
+            {"op": "update", "id": task_id, "assignee_id": assignee_id}
+            for task_id in random.sample(task_ids, min(batch_size, len(task_ids)))
+        ]},
+        headers=get_headers(dataset, board.member_ids[0]),
+    )
+
+
+async def run(
+    send: Callable[[], Awaitable[httpx.Response]],
+    requests: int,
+    concurrency: int,
+) -> Result:
+    result = Result()
+    remaining = iter(range(requests))
+
+    async def client() -> None:
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await send()
+            result.latencies.append(time.perf_counter() - start)
+            result.statuses[response.status_code] += 1
+
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+
+    return result
+
+
+def report(name: str, result: Result, elapsed: float, queries: int) -> None:
+    p50, p95, p99 = (statistics.quantiles(result.latencies, n=100)[index] * 1000 for index in (49, 94, 98))
+    requests = len(result.latencies)
+
+    print(
+        f"{name:<10} {requests:>6} req  p50 {p50:8.1f} ms  p95 {p95:8.1f} ms  p99 {p99:8.1f} ms  "
+        f"{requests / elapsed:8.1f} req/s  {queries / requests:6.1f} queries/req  {dict(result.statuses)}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000, help="registered users")
+    parser.add_argument("--boards", type=int, default=5, help="boards, each with its own columns and tasks")
+    parser.add_argument("--members", type=int, default=20, help="members of each board, besides its owner")
+    parser.add_argument("--columns", type=int, default=20, help="columns of each board")
+    parser.add_argument("--tasks", type=int, default=2000, help="tasks of each board, spread over its columns")
+    parser.add_argument("--logs", type=int, default=20, help="log entries of each task")
+    parser.add_argument("--requests", type=int, default=500, help="requests of each scenario")
+    parser.add_argument("--logins", type=int, default=100, help="requests of the login scenario")
+    parser.add_argument("--batch-size", type=int, default=50, help="tasks reassigned by each batch")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent clients")
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=["login", "render", "drag", "reassign"],
+        default=["login", "render", "drag", "reassign"],
+        help="scenarios to run, in order",
+    )
+    args = parser.parse_args()
+
+    queries = 0
+
+    def count_query(*_) -> None:
+        nonlocal queries
+        queries += 1
+
+    # Runs the startup of the app, which also creates the tables of an in-memory database
+    async with app.router.lifespan_context(app):
+        start = time.perf_counter()
+        dataset = await seed(args)
+        print(f"seeded in {time.perf_counter() - start:.1f} s")
+
+        scenarios: dict[str, tuple[Callable[[httpx.AsyncClient], Awaitable[httpx.Response]], int]] = {
+            "login": (lambda client: login(client, dataset), args.logins),
+            "render": (lambda client: render(client, dataset), args.requests),
+            "drag": (lambda client: drag(client, dataset), args.requests),
+            "reassign": (lambda client: reassign(client, dataset, args.batch_size), args.requests),
+        }
+
+        event.listen(api.db.engine.sync_engine, "before_cursor_execute", count_query)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=120) as client:
+            for name in args.scenarios:
+                send, requests = scenarios[name]
+
+                queries = 0
+                start = time.perf_counter()
+                result = await run(lambda: send(client), requests, args.concurrency)
+                report(name, result, time.perf_counter() - start, queries)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""Fires concurrent task and column creations at one board and checks every item got its own position.
+
+Run from the repository root against a scratch database, with the same environment as the API:
+
+    python -m benchmarks.position_stress --requests 300
+
+DATABASE_URL=sqlite+aiosqlite:///:memory: runs it without a database server.
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+import uuid
+
+import httpx
+
+import api.db
+from api.main import app
+
+
+async def register(client: httpx.AsyncClient) -> dict[str, str]:
+    username = f"stress-{uuid.uuid4().hex[:12]}"
+    response = await client.post("/register", json={"username": username, "name": username, "password": "stress"})
+    response.raise_for_status()
+
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def collect(client: httpx.AsyncClient, url: str, headers: dict[str, str]) -> list[dict]:
+    items = []
+    params: dict[str, str | int] = {"limit": 200}
+    while True:
+        response = await client.get(url, params=params, headers=headers)
+        response.raise_for_status()
+
+        page = response.json()
+        items += page["items"]
+        if page["next_cursor"] is None:
+            return items
+
+        params["after"] = page["next_cursor"]
+
+
+def report(name: str, responses: list[httpx.Response], items: list[dict]) -> bool:
+    statuses = Counter(response.status_code for response in responses)
+    duplicates = [position for position, count in Counter(item["position"] for item in items).items() if count > 1]
+
+    print(f"{name}: {dict(statuses)}, {len(items)} stored, {len(duplicates)} duplicated positions")
+
+    return statuses == Counter({201: len(responses)}) and len(items) == len(responses) and not duplicates
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300, help="concurrent creations of each kind")
+    args = parser.parse_args()
+
+    await api.db.migrate()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://stress", timeout=120) as client:
+        headers = await register(client)
+
+        board = (await client.post("/boards/", json={"name": "stress"}, headers=headers)).json()
+        column = (await client.post(f"/boards/{board['id']}/columns/", json={"name": "stress"}, headers=headers)).json()
+
+        task_responses = await asyncio.gather(*[
+            client.post(
+                f"/columns/{column['id']}/tasks/",
+                json={"name": f"task {index}", "description": None, "assignee_id": None},
+                headers=headers,
+            )
+            for index in range(args.requests)
+        ])
+        column_responses = await asyncio.gather(*[
+            client.post(f"/boards/{board['id']}/columns/", json={"name": f"column {index}"}, headers=headers)
+            for index in range(args.requests)
+        ])
+
+        tasks = await collect(client, f"/columns/{column['id']}/tasks/", headers)
+        # The board's first column was created before the burst
+        columns = (await collect(client, f"/boards/{board['id']}/columns/", headers))[1:]
+
+    await api.db.engine.dispose()
+
+    tasks_ok = report("tasks", task_responses, tasks)
+    columns_ok = report("columns", column_responses, columns)
+    if not (tasks_ok and columns_ok):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
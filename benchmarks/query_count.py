@@ -0,0 +1,116 @@
+"""Checks the read endpoints run as many queries for a board with one member and task as for one with many.
+
+A count growing with the members, tasks or boards is an N+1: one query per row instead of one for them all. Run from
+the repository root against a scratch, migrated database, with the same environment as the API:
+
+    python -m benchmarks.query_count --rows 100
+
+DATABASE_URL=sqlite+aiosqlite:///:memory: runs it without a database server. The counts come from the X-Query-Count
+header, turned on here whatever QUERY_COUNT_HEADERS says. Each endpoint is read twice and the second read counted, so
+the in-process caches are warm both times.
+"""
+
+import argparse
+import asyncio
+from datetime import timedelta
+import uuid
+
+import httpx
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import api.db
+import api.main
+import api.utils
+from api.main import app
+from api.routers.auth import ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token
+
+
+def get_headers(user: api.db.User) -> dict[str, str]:
+    token = create_access_token(
+        data={"sub": user.username, "uid": user.id, "ver": user.token_version},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+
+    return {"Authorization": f"Bearer {token.access_token}"}
+
+
+async def seed(rows: int, hashed_password: str) -> dict[str, tuple[str, dict[str, str]]]:
+    """A board with `rows` members and tasks, and a member sharing `rows` boards. Returns the URLs to read."""
+    prefix = f"count-{uuid.uuid4().hex[:8]}"
+
+    async with AsyncSession(api.db.engine, expire_on_commit=False) as session:
+        owner, *members = [
+            await api.db.register_user(
+                session, username=f"{prefix}-{index}", name=f"Count user {index}", hashed_password=hashed_password
+            )
+            for index in range(rows + 1)
+        ]
+
+        boards = [await api.db.create_board(session, owner, name=f"Count board {index}") for index in range(rows)]
+        board = boards[0]
+        for member in members:
+            await api.db.add_user(session, board, member.id)
+        for other_board in boards[1:]:
+            await api.db.add_user(session, other_board, members[0].id)
+
+        column = await api.db.create_column(session, board, name="Count column")
+        tasks = await api.db.create_tasks(session, column, [
+            {
+                "name": f"Task {index}",
+                "description": None,
+                "assignee_id": members[index % len(members)].id,
+                "created_by": owner.id,
+            }
+            for index in range(rows)
+        ])
+        await api.db.create_task_logs(session, [(task, f"Log of {task.name}") for task in tasks])
+        await api.db.commit(session)
+
+    owner_headers, member_headers = get_headers(owner), get_headers(members[0])
+
+    return {
+        "board members": (f"/boards/{board.id}/users/", owner_headers),
+        "shared boards": ("/boards/shared/", member_headers),
+        "board render": (f"/boards/{board.id}/full", owner_headers),
+        "column tasks": (f"/columns/{column.id}/tasks/", owner_headers),
+        "board tasks": (f"/boards/{board.id}/tasks/", owner_headers),
+        "assigned tasks": ("/users/me/tasks/", member_headers),
+        "task logs": (f"/tasks/{tasks[0].id}/logs/", owner_headers),
+    }
+
+
+async def count_queries(client: httpx.AsyncClient, url: str, headers: dict[str, str]) -> int:
+    for _ in range(2):
+        response = await client.get(url, headers=headers)
+        response.raise_for_status()
+
+    return int(response.headers["X-Query-Count"])
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100, help="members, tasks and shared boards of the large case")
+    args = parser.parse_args()
+
+    api.main.QUERY_COUNT_HEADERS = True
+    hashed_password = await api.utils.get_password_hash("count")
+
+    # Runs the startup of the app, which also creates the tables of an in-memory database
+    async with app.router.lifespan_context(app):
+        small, large = await seed(1, hashed_password), await seed(args.rows, hashed_password)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://count", timeout=120) as client:
+            failed = False
+            for name in small:
+                small_count = await count_queries(client, *small[name])
+                large_count = await count_queries(client, *large[name])
+                failed = failed or small_count != large_count
+                print(f"{name:<16} {small_count:>3} queries with 1 row, {large_count:>3} with {args.rows}")
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
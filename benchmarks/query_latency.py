@@ -0,0 +1,209 @@
+"""Latency of the list queries in api.db.utils on a large generated data set.
+
+Run from the repository root against a scratch database, with the same environment as the API:
+
+    python -m benchmarks.query_latency --seed --tasks 1000000
+    python -m benchmarks.query_latency --without-indexes
+
+--seed fills the database with generated boards, columns, tasks and logs (PostgreSQL only),
+--without-indexes drops the secondary indexes and unique constraints for the run and restores them afterwards.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+from time import perf_counter
+
+from sqlalchemy import text
+from sqlalchemy.schema import AddConstraint, DropConstraint, UniqueConstraint
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import api.db
+import api.dependencies
+
+USERS = 1000
+COLUMNS_PER_BOARD = 10
+TASKS_PER_COLUMN = 1000
+LOGS_PER_TASK = 3
+MEMBERS_PER_BOARD = 20
+
+
+async def seed(tasks: int) -> None:
+    boards = max(tasks // (COLUMNS_PER_BOARD * TASKS_PER_COLUMN), 1)
+    params = {
+        "users": USERS,
+        "boards": boards,
+        "columns": COLUMNS_PER_BOARD,
+        "tasks": TASKS_PER_COLUMN,
+        "logs": LOGS_PER_TASK,
+        "members": MEMBERS_PER_BOARD,
+    }
+
+    await api.db.migrate()
+
+    async with api.db.engine.begin() as connection:
+        await connection.execute(text(
+            "INSERT INTO \"user\" (username, name, hashed_password, token_version) "
+            "SELECT 'bench-' || g, 'Bench user ' || g, 'x', 0 FROM generate_series(1, :users) g"
+        ), params)
+        first_user_id = (await connection.execute(text(
+            "SELECT min(id) FROM \"user\" WHERE username LIKE 'bench-%'"
+        ))).scalar_one()
+        params["first_user_id"] = first_user_id
+
+        await connection.execute(text(
+            "INSERT INTO board (owner_id, name, revision, version) "
+            "SELECT :first_user_id + (g % :users), 'bench board ' || g, 0, 1 FROM generate_series(1, :boards) g"
+        ), params)
+        await connection.execute(text(
+            "INSERT INTO boarduseraccess (board_id, user_id) "
+            "SELECT b.id, :first_user_id + ((b.id * 31 + g) % :users) "
+            "FROM board b CROSS JOIN generate_series(1, :members) g "
+            "WHERE b.name LIKE 'bench board %' AND :first_user_id + ((b.id * 31 + g) % :users) <> b.owner_id "
+            "ON CONFLICT DO NOTHING"
+        ), params)
+        await connection.execute(text(
+            "INSERT INTO \"column\" (board_id, position, name, revision, version, updated_at) "
+            "SELECT b.id, p, 'column ' || p, 0, 1, now() FROM board b CROSS JOIN generate_series(0, :columns - 1) p "
+            "WHERE b.name LIKE 'bench board %'"
+        ), params)
+        await connection.execute(text(
+            "INSERT INTO task (column_id, position, name, description, assignee_id, created_at, created_by, "
+            "revision, version, updated_at) "
+            "SELECT c.id, p, 'task ' || p, NULL, :first_user_id + ((c.id * 7919 + p) % :users), "
+            "now() - p * interval '1 minute', b.owner_id, 0, 1, now() "
+            "FROM \"column\" c JOIN board b ON b.id = c.board_id CROSS JOIN generate_series(0, :tasks - 1) p "
+            "WHERE b.name LIKE 'bench board %'"
+        ), params)
+        await connection.execute(text(
+            "INSERT INTO tasklog (task_id, content, created_at) "
+            "SELECT t.id, 'log ' || g, t.created_at + g * interval '1 minute' "
+            "FROM task t JOIN \"column\" c ON c.id = t.column_id JOIN board b ON b.id = c.board_id "
+            "CROSS JOIN generate_series(1, :logs) g "
+            "WHERE b.name LIKE 'bench board %'"
+        ), params)
+
+    async with api.db.engine.connect() as connection:
+        await connection.execution_options(isolation_level="AUTOCOMMIT")
+        await connection.execute(text("ANALYZE"))
+
+
+def secondary_indexes():
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            yield index
+
+
+def unique_constraints():
+    for table in SQLModel.metadata.sorted_tables:
+        for constraint in table.constraints:
+            if isinstance(constraint, UniqueConstraint) and constraint.name is not None:
+                yield constraint
+
+
+async def drop_indexes() -> None:
+    async with api.db.engine.begin() as connection:
+        for index in secondary_indexes():
+            await connection.run_sync(index.drop, checkfirst=True)
+        for constraint in unique_constraints():
+            await connection.execute(DropConstraint(constraint))
+
+
+async def restore_indexes() -> None:
+    async with api.db.engine.begin() as connection:
+        for index in secondary_indexes():
+            await connection.run_sync(index.create, checkfirst=True)
+        for constraint in unique_constraints():
+            await connection.execute(AddConstraint(constraint))
+
+
+async def sample_ids(session: AsyncSession, query: str, count: int) -> list[int]:
+    ids = list((await session.execute(text(query))).scalars())
+    return random.sample(ids, min(count, len(ids)))
+
+
+async def measure(name: str, samples: list, run) -> None:
+    durations = []
+    for sample in samples:
+        async with AsyncSession(api.db.engine) as session:
+            started_at = perf_counter()
+            await run(session, sample)
+            durations.append((perf_counter() - started_at) * 1000)
+
+    durations.sort()
+    p95 = durations[int(len(durations) * 0.95) - 1] if len(durations) >= 20 else durations[-1]
+    print(f"{name:<32} p50 {statistics.median(durations):8.2f} ms   p95 {p95:8.2f} ms   ({len(durations)} runs)")
+
+
+async def benchmark(runs: int) -> None:
+    async with AsyncSession(api.db.engine) as session:
+        users = await sample_ids(session, "SELECT id FROM \"user\" WHERE username LIKE 'bench-%'", runs)
+        boards = await sample_ids(session, "SELECT id FROM board WHERE name LIKE 'bench board %'", runs)
+        columns = await sample_ids(session, "SELECT id FROM \"column\"", runs)
+        tasks = await sample_ids(session, "SELECT id FROM task TABLESAMPLE SYSTEM (1)", runs)
+        task_count = (await session.execute(text("SELECT count(*) FROM task"))).scalar_one()
+
+    print(f"{task_count} tasks")
+
+    # What the list endpoints fetch with their default page size
+    pagination = api.db.Pagination(limit=api.dependencies.DEFAULT_PAGE_SIZE)
+
+    async def get_columns(session: AsyncSession, board_id: int):
+        await api.db.get_columns(session, api.db.Board(id=board_id, owner_id=0, name=""), pagination)
+
+    async def get_tasks(session: AsyncSession, column_id: int):
+        column = api.db.Column(id=column_id, board_id=0, position=0, name="")
+        await api.db.get_tasks(session, column, dict(), "position", pagination)
+
+    async def get_assigned_tasks(session: AsyncSession, column_id: int):
+        column = api.db.Column(id=column_id, board_id=0, position=0, name="")
+        await api.db.get_tasks(session, column, {"assignee_id": [random.choice(users)]}, "position", pagination)
+
+    async def get_task_logs(session: AsyncSession, task_id: int):
+        await api.db.get_task_logs(
+            session,
+            api.db.Task(id=task_id, column_id=0, position=0, name="", description=None, assignee_id=None, created_by=0),
+            pagination,
+        )
+
+    async def get_owned_boards(session: AsyncSession, user_id: int):
+        await api.db.get_owned_boards(session, user_id, pagination)
+
+    async def get_shared_boards(session: AsyncSession, user_id: int):
+        await api.db.get_shared_boards(session, user_id, pagination)
+
+    await measure("get_columns", boards, get_columns)
+    await measure("get_tasks", columns, get_tasks)
+    await measure("get_tasks (assignee filter)", columns, get_assigned_tasks)
+    await measure("get_task_logs", tasks, get_task_logs)
+    await measure("get_owned_boards", users, get_owned_boards)
+    await measure("get_shared_boards", users, get_shared_boards)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true", help="generate the data set before measuring")
+    parser.add_argument("--tasks", type=int, default=1_000_000, help="number of tasks to generate with --seed")
+    parser.add_argument("--runs", type=int, default=200, help="measurements per query")
+    parser.add_argument("--without-indexes", action="store_true", help="measure without secondary indexes")
+    args = parser.parse_args()
+
+    if args.seed:
+        await seed(args.tasks)
+
+    if args.without_indexes:
+        await drop_indexes()
+
+    try:
+        await benchmark(args.runs)
+    finally:
+        if args.without_indexes:
+            await restore_indexes()
+
+        await api.db.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())